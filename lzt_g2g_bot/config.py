@@ -1,6 +1,6 @@
 import os
 from dataclasses import dataclass, field
-from typing import List
+from typing import Dict, List, Tuple
 
 @dataclass
 class Config:
@@ -11,12 +11,134 @@ class Config:
     
     # Database
     DATABASE_URL: str = "sqlite+aiosqlite:///database.db"
+    DATABASE_PATH: str = "database.db"
+    DB_READERS: int = 3
+    DB_STATEMENT_CACHE_SIZE: int = 256
+    DB_BUSY_TIMEOUT_MS: int = 5000
+    # Кэш пользователей, их настроек и ключей (LRU по user_id)
+    USER_CACHE_SIZE: int = 10000
     
     # Encryption
     ENCRYPTION_KEY: str = "G3ld45FLGSLFGgg"
+    ENCRYPTION_KEY_ID: str = "v1"
+    # Старые ключи для ротации: ID -> пароль
+    ENCRYPTION_OLD_KEYS: Dict[str, str] = field(default_factory=dict)
+    # Готовый ключ Fernet для текущего ID (пропускает PBKDF2 при старте)
+    ENCRYPTION_DERIVED_KEY: str = os.getenv("ENCRYPTION_DERIVED_KEY", "")
+    ENCRYPTION_KEY_CACHE_FILE: str = ".encryption_keys.json"
+    CREDENTIALS_CACHE_SIZE: int = 10000
+    CREDENTIALS_CACHE_TTL: int = 3600
     
     # API URLs
     LZT_API_URL: str = "https://api.zelenka.guru"
     G2G_API_URL: str = "https://api.g2g.com"
+    
+    # Шаблоны объявлений G2G (templates/*.txt) и лимит длины названия
+    TEMPLATES_DIR: str = os.path.join(os.path.dirname(os.path.abspath(__file__)), "templates")
+    G2G_TITLE_MAX_LENGTH: int = 150
+    
+    # Ценообразование: комиссия G2G с продажи (%) и минимальная прибыль с оффера ($)
+    G2G_FEE_PERCENT: float = 0.0
+    PRICING_MIN_PROFIT: float = 0.0
+    
+    # Проверка заказов
+    ORDER_CHECK_INTERVAL_MINUTES: int = 5
+    ORDER_CHECK_CONCURRENCY: int = 20
+    ORDER_CHECK_USER_TIMEOUT: int = 30
+    ORDER_CHECK_JITTER: float = 2.0
+    # С вебхуком опрос G2G нужен только для сверки пропущенных событий
+    ORDER_RECONCILE_INTERVAL_MINUTES: int = 30
+    # Очередь заказов (SQLite): воркеры, повторы с экспоненциальной задержкой
+    ORDER_WORKERS: int = 4
+    ORDER_JOB_MAX_ATTEMPTS: int = 6
+    ORDER_JOB_BACKOFF_BASE: float = 10.0
+    ORDER_JOB_BACKOFF_MAX: float = 900.0
+    ORDER_QUEUE_POLL_INTERVAL: float = 5.0
+    # Задача в running дольше этого срока (воркер упал, не записав результат) снова выдается воркерам.
+    # Живой воркер продлевает аренду каждые ORDER_JOB_HEARTBEAT_SECONDS
+    ORDER_JOB_LEASE_SECONDS: int = 600
+    ORDER_JOB_HEARTBEAT_SECONDS: int = 60
+    ORDER_JOBS_TTL_DAYS: int = 30
+    
+    # Вебхук G2G (HTTP сервер в том же цикле событий, что и бот)
+    G2G_WEBHOOK_ENABLED: bool = os.getenv("G2G_WEBHOOK_ENABLED", "0") == "1"
+    G2G_WEBHOOK_HOST: str = os.getenv("G2G_WEBHOOK_HOST", "0.0.0.0")
+    G2G_WEBHOOK_PORT: int = int(os.getenv("G2G_WEBHOOK_PORT", "8080"))
+    G2G_WEBHOOK_PATH: str = "/webhooks/g2g"
+    # Допустимое расхождение времени подписи, секунд
+    G2G_WEBHOOK_TOLERANCE: int = 300
+    G2G_WEBHOOK_EVENTS_TTL_DAYS: int = 7
+    
+    # Лимиты запросов на один API токен: хост -> {класс: (запросов в минуту, всплеск)}
+    # LZT Market API: 120 запросов в минуту, поиск по категориям - 20 в минуту
+    RATE_LIMITS: Dict[str, Dict[str, Tuple[int, int]]] = field(default_factory=lambda: {
+        "api.zelenka.guru": {"default": (120, 5), "search": (20, 2)},
+        "api.g2g.com": {"default": (60, 5)}
+    })
+    RATE_LIMIT_MAX_RETRIES: int = 3
+    RATE_LIMIT_DEFAULT_RETRY_AFTER: float = 10.0
+    LZT_DETAILS_CONCURRENCY: int = 5
+    LZT_SYNC_MAX_PAGES: int = 5
+    # Фильтры поиска LZT, которые применяются на стороне сервера для всех пользователей:
+    # происхождение аккаунтов (origin[]) и параметры конкретных категорий (например, game[] для steam)
+    LZT_ORIGINS: List[str] = field(default_factory=list)
+    LZT_CATEGORY_PARAMS: Dict[str, Dict] = field(default_factory=dict)
+    # Сколько подходящих аккаунтов показывает ручной парсинг
+    PARSER_PREVIEW_LIMIT: int = 10
+    
+    # Конвейер автопостинга: воркеры стадий и размер очередей между ними
+    AUTO_POST_FETCH_CONCURRENCY: int = 2
+    AUTO_POST_PUBLISH_CONCURRENCY: int = 3
+    AUTO_POST_QUEUE_SIZE: int = 20
+    AUTO_POST_PERSIST_BATCH: int = 50
+    # Повторы записи уже опубликованных офферов в БД
+    AUTO_POST_PERSIST_RETRIES: int = 3
+    AUTO_POST_PERSIST_RETRY_DELAY: float = 1.0
+    
+    # Планировщик автопостинга: общий лимит одновременных запусков для всех пользователей
+    AUTO_POST_CONCURRENCY: int = 4
+    AUTO_POST_USER_INTERVAL_MINUTES: int = 15
+    AUTO_POST_RUN_TIMEOUT: int = 600
+    AUTO_POST_REFRESH_INTERVAL: int = 60
+    # Вес тарифа в справедливой очереди: доля общего времени запусков
+    AUTO_POST_TIER_WEIGHTS: Dict[str, float] = field(default_factory=lambda: {
+        "basic": 1.0,
+        "premium": 2.0,
+        "pro": 4.0,
+        "owner": 8.0
+    })
+    # Дневные квоты объявлений по тарифам; счетчики хранятся QUOTA_HISTORY_DAYS дней
+    DAILY_POST_LIMITS: Dict[str, int] = field(default_factory=lambda: {
+        "basic": 20,
+        "premium": 50,
+        "pro": 100,
+        "owner": 9999
+    })
+    QUOTA_HISTORY_DAYS: int = 30
+    # Пауза пользователя после 429 от LZT: растет вдвое за каждый запуск подряд
+    AUTO_POST_BACKOFF_BASE: float = 60.0
+    AUTO_POST_BACKOFF_MAX: float = 3600.0
+    
+    # Общий кэш объявлений LZT (одинаковые категории у разных пользователей)
+    LISTING_CACHE_TTL: int = 60
+    LISTING_CACHE_SIZE: int = 500
+    LISTING_CACHE_PRICE_STEP: int = 50
+    
+    # HTTP клиент (общий пул соединений)
+    HTTP_TIMEOUT: int = 10
+    HTTP_LIMIT: int = 100
+    HTTP_LIMIT_PER_HOST: int = 20
+    HTTP_DNS_CACHE_TTL: int = 300
+    HTTP_KEEPALIVE_TIMEOUT: int = 60
+    # Переопределение лимита соединений для конкретных хостов
+    HTTP_HOST_LIMITS: Dict[str, int] = field(default_factory=lambda: {
+        "api.zelenka.guru": 20,
+        "api.g2g.com": 10
+    })
+    
+    def __post_init__(self):
+        # При комиссии 100% и выше цена продажи не покрывает себестоимость (деление на ноль)
+        if not 0 <= self.G2G_FEE_PERCENT < 100:
+            raise ValueError(f"G2G_FEE_PERCENT must be in [0, 100), got {self.G2G_FEE_PERCENT}")
 
 config = Config()
\ No newline at end of file
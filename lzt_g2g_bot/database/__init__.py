@@ -1,13 +1,16 @@
 # database/__init__.py
-import aiosqlite
 import logging
+from database.connection import db_pool
+from database.migrations import run_migrations
 
 logger = logging.getLogger(__name__)
 
 async def init_db():
     """Инициализация базы данных"""
     try:
-        async with aiosqlite.connect('database.db') as db:
+        await db_pool.connect()
+        
+        async with db_pool.write() as db:
             # Таблица пользователей
             await db.execute('''
                 CREATE TABLE IF NOT EXISTS users (
@@ -46,7 +49,7 @@ async def init_db():
                     user_id INTEGER NOT NULL,
                     markup_percent INTEGER DEFAULT 20,
                     markup_fixed INTEGER DEFAULT 0,
-                    parser_categories TEXT DEFAULT '[]',
+                    parser_categories TEXT DEFAULT '[]',  -- устарело, категории в user_categories
                     price_min INTEGER DEFAULT 1,
                     price_max INTEGER DEFAULT 100,
                     account_age_filter TEXT DEFAULT 'any',
@@ -92,12 +95,28 @@ async def init_db():
                 )
             ''')
             
-            await db.commit()
-            logger.info("✅ Database initialized successfully")
+            # Курсоры инкрементальной синхронизации LZT (пользователь + категория)
+            await db.execute('''
+                CREATE TABLE IF NOT EXISTS lzt_sync_cursors (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    user_id INTEGER NOT NULL,
+                    category TEXT NOT NULL,
+                    last_published_date INTEGER DEFAULT 0,
+                    last_item_id INTEGER DEFAULT 0,
+                    updated_at TEXT DEFAULT CURRENT_TIMESTAMP,
+                    UNIQUE (user_id, category),
+                    FOREIGN KEY (user_id) REFERENCES users (id)
+                )
+            ''')
+        
+        # Индексы и прочие изменения схемы - через версионированные миграции
+        await run_migrations()
+        
+        logger.info("✅ Database initialized successfully")
     except Exception as e:
         logger.error(f"❌ Database initialization error: {e}")
         raise
 
-async def get_db():
-    """Получаем соединение с БД"""
-    return await aiosqlite.connect('database.db')
\ No newline at end of file
+async def close_db():
+    """Закрывает соединения с БД"""
+    await db_pool.close()
\ No newline at end of file
@@ -0,0 +1,102 @@
+# database/connection.py
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from typing import List, Optional
+
+import aiosqlite
+from config import config
+
+logger = logging.getLogger(__name__)
+
+class DatabasePool:
+    """Пул долгоживущих соединений SQLite: один писатель и N читателей (WAL)"""
+
+    def __init__(self, path: str, readers: int = 3):
+        self.path = path
+        self.readers_count = max(1, readers)
+        self._writer: Optional[aiosqlite.Connection] = None
+        self._readers: List[aiosqlite.Connection] = []
+        self._idle_readers: Optional[asyncio.Queue] = None
+        self._write_lock = asyncio.Lock()
+        self._connect_lock = asyncio.Lock()
+
+    @property
+    def is_connected(self) -> bool:
+        return self._writer is not None
+
+    async def _open(self, read_only: bool = False) -> aiosqlite.Connection:
+        """Открывает соединение и настраивает PRAGMA"""
+        conn = await aiosqlite.connect(
+            self.path,
+            cached_statements=config.DB_STATEMENT_CACHE_SIZE
+        )
+        await conn.execute(f"PRAGMA busy_timeout = {config.DB_BUSY_TIMEOUT_MS}")
+        await conn.execute("PRAGMA synchronous = NORMAL")
+        if read_only:
+            await conn.execute("PRAGMA query_only = ON")
+        return conn
+
+    async def connect(self):
+        """Открывает соединения (повторный вызов ничего не делает)"""
+        async with self._connect_lock:
+            if self._writer is not None:
+                return
+
+            writer = await self._open()
+            # WAL позволяет читателям работать параллельно с писателем
+            await writer.execute("PRAGMA journal_mode = WAL")
+            await writer.commit()
+
+            idle_readers = asyncio.Queue()
+            for _ in range(self.readers_count):
+                reader = await self._open(read_only=True)
+                self._readers.append(reader)
+                idle_readers.put_nowait(reader)
+
+            self._idle_readers = idle_readers
+            self._writer = writer
+            logger.info(f"✅ Database pool opened: 1 writer, {self.readers_count} readers")
+
+    async def close(self):
+        """Закрывает все соединения пула"""
+        async with self._connect_lock:
+            if self._writer is None:
+                return
+
+            for reader in self._readers:
+                await reader.close()
+            self._readers.clear()
+            self._idle_readers = None
+
+            await self._writer.close()
+            self._writer = None
+            logger.info("✅ Database pool closed")
+
+    @asynccontextmanager
+    async def read(self):
+        """Выдает соединение для чтения из пула"""
+        if self._writer is None:
+            await self.connect()
+
+        conn = await self._idle_readers.get()
+        try:
+            yield conn
+        finally:
+            self._idle_readers.put_nowait(conn)
+
+    @asynccontextmanager
+    async def write(self):
+        """Выдает соединение писателя; транзакция фиксируется при выходе"""
+        if self._writer is None:
+            await self.connect()
+
+        async with self._write_lock:
+            try:
+                yield self._writer
+                await self._writer.commit()
+            except BaseException:
+                await self._writer.rollback()
+                raise
+
+db_pool = DatabasePool(config.DATABASE_PATH, config.DB_READERS)
@@ -1,18 +1,45 @@
 # database/crud.py
-import aiosqlite
 import json
+import logging
+import time
 from datetime import datetime, timedelta
+from cryptography.fernet import InvalidToken
+from config import config
+from database.connection import db_pool
+from database.models import User, UserApiKeys, UserSettings, UserOffer, UserOrder, OrderJob
+from database.user_cache import user_cache, MISSING
+from services.encryption import encryption_service
+
+logger = logging.getLogger(__name__)
 
 # ===== USER METHODS =====
 async def get_or_create_user(telegram_id: int, username: str = None, 
                            first_name: str = None, last_name: str = None):
     """Получает или создает пользователя"""
-    async with aiosqlite.connect('database.db') as db:
-        # Проверяем существующего пользователя
+    # Пользователь в кэше - обходимся без БД
+    user_id = user_cache.get_user_id(telegram_id)
+    if user_id is not None:
+        user = user_cache.get(user_id, 'user')
+        if user is not MISSING:
+            return user
+    
+    # Чаще всего пользователь уже есть - обходимся соединением для чтения
+    async with db_pool.read() as db:
         cursor = await db.execute(
-            "SELECT * FROM users WHERE telegram_id = ?", (telegram_id,)
+            f"SELECT {User.COLUMNS} FROM users WHERE telegram_id = ?", (telegram_id,)
         )
-        user = await cursor.fetchone()
+        user = User.from_row(await cursor.fetchone())
+    
+    if user:
+        user_cache.set(user.id, 'user', user, overwrite=False)
+        return user
+    
+    async with db_pool.write() as db:
+        # Повторная проверка под блокировкой писателя
+        cursor = await db.execute(
+            f"SELECT {User.COLUMNS} FROM users WHERE telegram_id = ?", (telegram_id,)
+        )
+        user = User.from_row(await cursor.fetchone())
         
         if not user:
             # Создаем нового пользователя
@@ -24,233 +51,699 @@ async def get_or_create_user(telegram_id: int, username: str = None,
                 VALUES (?, ?, ?, ?, ?)''',
                 (telegram_id, username, first_name, last_name, subscription_expiry)
             )
-            await db.commit()
             
             # Получаем созданного пользователя
             cursor = await db.execute(
-                "SELECT * FROM users WHERE telegram_id = ?", (telegram_id,)
+                f"SELECT {User.COLUMNS} FROM users WHERE telegram_id = ?", (telegram_id,)
             )
-            user = await cursor.fetchone()
+            user = User.from_row(await cursor.fetchone())
             
             # Создаем настройки по умолчанию
             await db.execute(
                 '''INSERT INTO user_settings (user_id) VALUES (?)''',
-                (user[0],)  # user[0] - это id пользователя
+                (user.id,)
             )
-            await db.commit()
-        
-        return user
+    
+    user_cache.set(user.id, 'user', user, overwrite=False)
+    return user
 
 async def update_subscription(telegram_id: int, subscription_type: str):
     """Обновляет тариф пользователя"""
-    async with aiosqlite.connect('database.db') as db:
+    async with db_pool.write() as db:
         subscription_expiry = (datetime.now() + timedelta(days=30)).isoformat()
         await db.execute(
             "UPDATE users SET subscription_type = ?, subscription_expiry = ? WHERE telegram_id = ?",
             (subscription_type, subscription_expiry, telegram_id)
         )
-        await db.commit()
+        
+        # Сквозная запись: кэш получает строку из той же транзакции
+        cursor = await db.execute(
+            f"SELECT {User.COLUMNS} FROM users WHERE telegram_id = ?", (telegram_id,)
+        )
+        user = User.from_row(await cursor.fetchone())
+    
+    if user:
+        user_cache.set(user.id, 'user', user)
+
+async def get_user_by_id(user_id: int):
+    """Получает пользователя по внутреннему id"""
+    user = user_cache.get(user_id, 'user')
+    if user is not MISSING:
+        return user
+    
+    async with db_pool.read() as db:
+        cursor = await db.execute(
+            f"SELECT {User.COLUMNS} FROM users WHERE id = ?", (user_id,)
+        )
+        user = User.from_row(await cursor.fetchone())
+    
+    if user:
+        user_cache.set(user_id, 'user', user, overwrite=False)
+    return user
 
 async def get_active_users():
     """Получает всех активных пользователей"""
-    async with aiosqlite.connect('database.db') as db:
+    async with db_pool.read() as db:
         cursor = await db.execute(
-            "SELECT * FROM users WHERE is_active = TRUE"
+            f"SELECT {User.COLUMNS} FROM users WHERE is_active = TRUE"
         )
-        return await cursor.fetchall()
+        return [User.from_row(row) for row in await cursor.fetchall()]
+
+async def get_auto_posting_users():
+    """Активные пользователи с ключами LZT и G2G и хотя бы одной категорией"""
+    async with db_pool.read() as db:
+        cursor = await db.execute(
+            f'''SELECT {", ".join(f"u.{column}" for column in User.COLUMNS.split(", "))} FROM users u
+            JOIN user_api_keys k ON k.user_id = u.id
+            WHERE u.is_active = TRUE
+            AND k.lzt_token IS NOT NULL AND k.g2g_api_key IS NOT NULL
+            AND EXISTS (SELECT 1 FROM user_categories uc WHERE uc.user_id = u.id)'''
+        )
+        return [User.from_row(row) for row in await cursor.fetchall()]
 
 # ===== API KEYS METHODS =====
 async def get_user_api_keys(user_id: int):
     """Получает API ключи пользователя"""
-    async with aiosqlite.connect('database.db') as db:
+    api_keys = user_cache.get(user_id, 'api_keys')
+    if api_keys is not MISSING:
+        return api_keys
+    
+    async with db_pool.read() as db:
+        cursor = await db.execute(
+            f"SELECT {UserApiKeys.COLUMNS} FROM user_api_keys WHERE user_id = ?", (user_id,)
+        )
+        api_keys = UserApiKeys.from_row(await cursor.fetchone())
+    
+    user_cache.set(user_id, 'api_keys', api_keys, overwrite=False)
+    return api_keys
+
+async def get_api_keys_by_g2g_user_id(g2g_user_id: str):
+    """Находит ключи продавца по его G2G User ID (для входящих вебхуков)"""
+    async with db_pool.read() as db:
         cursor = await db.execute(
-            "SELECT * FROM user_api_keys WHERE user_id = ?", (user_id,)
+            f"SELECT {UserApiKeys.COLUMNS} FROM user_api_keys WHERE g2g_user_id = ? AND is_active = TRUE",
+            (g2g_user_id,)
         )
-        return await cursor.fetchone()
+        return UserApiKeys.from_row(await cursor.fetchone())
+
+async def _select_api_keys(db, user_id: int):
+    """Ключи из той же транзакции, что и запись (для сквозной записи в кэш)"""
+    cursor = await db.execute(
+        f"SELECT {UserApiKeys.COLUMNS} FROM user_api_keys WHERE user_id = ?", (user_id,)
+    )
+    return UserApiKeys.from_row(await cursor.fetchone())
 
 async def save_lzt_token(user_id: int, token: str):
     """Сохраняет LZT токен"""
-    async with aiosqlite.connect('database.db') as db:
-        # Проверяем существующие ключи
+    async with db_pool.write() as db:
+        # user_id уникален - обновляем существующие ключи или создаем новые
+        await db.execute(
+            '''INSERT INTO user_api_keys 
+            (user_id, lzt_token, last_checked) 
+            VALUES (?, ?, ?)
+            ON CONFLICT (user_id) DO UPDATE SET 
+            lzt_token = excluded.lzt_token, 
+            last_checked = excluded.last_checked''',
+            (user_id, token, datetime.now().isoformat())
+        )
+        api_keys = await _select_api_keys(db, user_id)
+    
+    user_cache.set(user_id, 'api_keys', api_keys)
+    # Ключи изменились - расшифрованная копия в кэше больше не актуальна
+    encryption_service.invalidate_credentials(user_id)
+
+async def save_g2g_keys(user_id: int, api_key: str, secret: str, g2g_user_id: str) -> bool:
+    """Сохраняет G2G ключи; False, если этот G2G User ID уже привязан к другому пользователю"""
+    async with db_pool.write() as db:
         cursor = await db.execute(
-            "SELECT id FROM user_api_keys WHERE user_id = ?", (user_id,)
+            "SELECT 1 FROM user_api_keys WHERE g2g_user_id = ? AND user_id != ?",
+            (g2g_user_id, user_id)
         )
-        existing = await cursor.fetchone()
-        
-        if existing:
-            # Обновляем существующие
-            await db.execute(
-                "UPDATE user_api_keys SET lzt_token = ?, last_checked = ? WHERE user_id = ?",
-                (token, datetime.now().isoformat(), user_id)
-            )
-        else:
-            # Создаем новые
-            await db.execute(
-                '''INSERT INTO user_api_keys 
-                (user_id, lzt_token, last_checked) 
-                VALUES (?, ?, ?)''',
-                (user_id, token, datetime.now().isoformat())
-            )
+        if await cursor.fetchone():
+            return False
         
-        await db.commit()
+        # user_id уникален - обновляем существующие ключи или создаем новые
+        await db.execute(
+            '''INSERT INTO user_api_keys 
+            (user_id, g2g_api_key, g2g_secret, g2g_user_id, last_checked) 
+            VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT (user_id) DO UPDATE SET 
+            g2g_api_key = excluded.g2g_api_key, 
+            g2g_secret = excluded.g2g_secret, 
+            g2g_user_id = excluded.g2g_user_id, 
+            last_checked = excluded.last_checked''',
+            (user_id, api_key, secret, g2g_user_id, datetime.now().isoformat())
+        )
+        api_keys = await _select_api_keys(db, user_id)
+    
+    user_cache.set(user_id, 'api_keys', api_keys)
+    # Ключи изменились - расшифрованная копия в кэше больше не актуальна
+    encryption_service.invalidate_credentials(user_id)
+    return True
+
+async def rotate_encrypted_data() -> int:
+    """Перешифровывает текущим ключом API ключи и данные покупок, зашифрованные старыми ключами.
 
-async def save_g2g_keys(user_id: int, api_key: str, secret: str, g2g_user_id: str):
-    """Сохраняет G2G ключи"""
-    async with aiosqlite.connect('database.db') as db:
-        # Проверяем существующие ключи
+    Строки без префикса текущего ключа отбираются в SQL соединением для чтения - обычно
+    их нет, и блокировка писателя не берется. Возвращает число обновленных строк;
+    значения, которые не расшифровываются, пропускаются.
+    """
+    prefix = f"{config.ENCRYPTION_KEY_ID}:"
+    # substr вместо LIKE: в ID ключа могут быть % и _
+    stale = "({column} IS NOT NULL AND substr({column}, 1, ?) != ?)"
+    prefix_args = (len(prefix), prefix)
+    async with db_pool.read() as db:
         cursor = await db.execute(
-            "SELECT id FROM user_api_keys WHERE user_id = ?", (user_id,)
+            f'''SELECT id, user_id, lzt_token, g2g_api_key, g2g_secret FROM user_api_keys 
+            WHERE {" OR ".join(stale.format(column=column) for column in ("lzt_token", "g2g_api_key", "g2g_secret"))}''',
+            prefix_args * 3
         )
-        existing = await cursor.fetchone()
-        
-        if existing:
-            # Обновляем существующие
-            await db.execute(
-                """UPDATE user_api_keys 
-                SET g2g_api_key = ?, g2g_secret = ?, g2g_user_id = ?, last_checked = ? 
-                WHERE user_id = ?""",
-                (api_key, secret, g2g_user_id, datetime.now().isoformat(), user_id)
-            )
-        else:
-            # Создаем новые
-            await db.execute(
-                '''INSERT INTO user_api_keys 
-                (user_id, g2g_api_key, g2g_secret, g2g_user_id, last_checked) 
-                VALUES (?, ?, ?, ?, ?)''',
-                (user_id, api_key, secret, g2g_user_id, datetime.now().isoformat())
+        api_keys_rows = await cursor.fetchall()
+        cursor = await db.execute(
+            f"SELECT id, lzt_purchase_data FROM user_orders WHERE {stale.format(column='lzt_purchase_data')}",
+            prefix_args
+        )
+        order_rows = await cursor.fetchall()
+    
+    if not api_keys_rows and not order_rows:
+        return 0
+    
+    rotated = 0
+    rotated_users = set()
+    async with db_pool.write() as db:
+        for row_id, user_id, *values in api_keys_rows:
+            try:
+                new_values = encryption_service.rotate_values(values)
+            except InvalidToken:
+                logger.error(f"❌ API keys of user {user_id} can't be decrypted with known keys, not rotated")
+                continue
+            if new_values is None:
+                continue
+            # Ключи могли смениться после SELECT - тогда они уже под текущим ключом
+            cursor = await db.execute(
+                '''UPDATE user_api_keys SET lzt_token = ?, g2g_api_key = ?, g2g_secret = ? 
+                WHERE id = ? AND lzt_token IS ? AND g2g_api_key IS ? AND g2g_secret IS ?''',
+                (*new_values, row_id, *values)
             )
+            if cursor.rowcount:
+                rotated_users.add(user_id)
         
-        await db.commit()
+        for order_id, purchase_data in order_rows:
+            try:
+                new_values = encryption_service.rotate_values([purchase_data])
+            except InvalidToken:
+                logger.error(f"❌ Purchase data of order {order_id} can't be decrypted with known keys, not rotated")
+                continue
+            if new_values is None:
+                continue
+            cursor = await db.execute(
+                "UPDATE user_orders SET lzt_purchase_data = ? WHERE id = ? AND lzt_purchase_data = ?",
+                (new_values[0], order_id, purchase_data)
+            )
+            rotated += cursor.rowcount
+    
+    for user_id in rotated_users:
+        user_cache.invalidate(user_id)
+    return rotated + len(rotated_users)
 
 # ===== SETTINGS METHODS =====
 async def get_user_settings(user_id: int):
     """Получает настройки пользователя"""
-    async with aiosqlite.connect('database.db') as db:
+    settings = user_cache.get(user_id, 'settings')
+    if settings is not MISSING:
+        return settings
+    
+    async with db_pool.read() as db:
         cursor = await db.execute(
-            "SELECT * FROM user_settings WHERE user_id = ?", (user_id,)
+            f"SELECT {UserSettings.COLUMNS} FROM user_settings WHERE user_id = ?", (user_id,)
         )
-        return await cursor.fetchone()
+        settings = UserSettings.from_row(await cursor.fetchone())
+    
+    user_cache.set(user_id, 'settings', settings, overwrite=False)
+    return settings
 
 async def update_user_settings(user_id: int, updates: dict):
     """Обновляет настройки пользователя"""
-    async with aiosqlite.connect('database.db') as db:
+    async with db_pool.write() as db:
         set_clause = ", ".join([f"{key} = ?" for key in updates.keys()])
         values = list(updates.values())
+        values.append(datetime.now().isoformat())
         values.append(user_id)
         
         await db.execute(
             f"UPDATE user_settings SET {set_clause}, updated_at = ? WHERE user_id = ?",
-            values + [datetime.now().isoformat()]
+            values
+        )
+        
+        # Сквозная запись: кэш получает строку из той же транзакции
+        cursor = await db.execute(
+            f"SELECT {UserSettings.COLUMNS} FROM user_settings WHERE user_id = ?", (user_id,)
         )
-        await db.commit()
+        settings = UserSettings.from_row(await cursor.fetchone())
+    
+    user_cache.set(user_id, 'settings', settings)
+
+# ===== CATEGORIES METHODS =====
+async def get_user_categories(user_id: int) -> list:
+    """Категории парсера пользователя в порядке выбора"""
+    categories = user_cache.get(user_id, 'categories')
+    if categories is not MISSING:
+        return list(categories)
+    
+    async with db_pool.read() as db:
+        cursor = await db.execute(
+            "SELECT category FROM user_categories WHERE user_id = ? ORDER BY id", (user_id,)
+        )
+        categories = tuple(row[0] for row in await cursor.fetchall())
+    
+    user_cache.set(user_id, 'categories', categories, overwrite=False)
+    return list(categories)
+
+async def _select_user_categories(db, user_id: int) -> tuple:
+    """Категории из той же транзакции, что и запись (для сквозной записи в кэш)"""
+    cursor = await db.execute(
+        "SELECT category FROM user_categories WHERE user_id = ? ORDER BY id", (user_id,)
+    )
+    return tuple(row[0] for row in await cursor.fetchall())
+
+async def toggle_user_category(user_id: int, category: str) -> list:
+    """Добавляет категорию или убирает уже выбранную; возвращает новый список"""
+    async with db_pool.write() as db:
+        cursor = await db.execute(
+            "DELETE FROM user_categories WHERE user_id = ? AND category = ?",
+            (user_id, category)
+        )
+        if cursor.rowcount == 0:
+            await db.execute(
+                "INSERT INTO user_categories (user_id, category) VALUES (?, ?)",
+                (user_id, category)
+            )
+        categories = await _select_user_categories(db, user_id)
+    
+    user_cache.set(user_id, 'categories', categories)
+    return list(categories)
+
+async def get_category_markups(user_id: int) -> dict:
+    """Наценки, заданные пользователем для отдельных категорий: категория -> %"""
+    async with db_pool.read() as db:
+        cursor = await db.execute(
+            "SELECT category, markup_percent FROM user_categories WHERE user_id = ? AND markup_percent IS NOT NULL",
+            (user_id,)
+        )
+        return dict(await cursor.fetchall())
+
+async def set_category_markup(user_id: int, category: str, markup_percent: int = None) -> bool:
+    """Наценка для выбранной категории; None - использовать общую из настроек.
+    False, если категория не выбрана пользователем"""
+    async with db_pool.write() as db:
+        cursor = await db.execute(
+            "UPDATE user_categories SET markup_percent = ? WHERE user_id = ? AND category = ?",
+            (markup_percent, user_id, category)
+        )
+        return cursor.rowcount == 1
 
 # ===== OFFERS METHODS =====
 async def create_user_offer(user_id: int, lzt_item_id: str, g2g_offer_id: str, title: str, price: float, category: str):
     """Создает запись об оффере"""
-    async with aiosqlite.connect('database.db') as db:
-        await db.execute(
+    await create_user_offers_bulk(user_id, [{
+        'lzt_item_id': lzt_item_id,
+        'g2g_offer_id': g2g_offer_id,
+        'title': title,
+        'price': price,
+        'category': category
+    }])
+
+async def create_user_offers_bulk(user_id: int, offers: list) -> int:
+    """Создает записи о нескольких офферах одной транзакцией"""
+    if not offers:
+        return 0
+    
+    async with db_pool.write() as db:
+        await db.executemany(
             '''INSERT INTO user_offers 
-            (user_id, lzt_item_id, g2g_offer_id, title, price, category) 
-            VALUES (?, ?, ?, ?, ?, ?)''',
-            (user_id, lzt_item_id, g2g_offer_id, title, price, category)
+            (user_id, lzt_item_id, g2g_offer_id, title, price, lzt_price, markup_percent, category) 
+            VALUES (?, ?, ?, ?, ?, ?, COALESCE(?, 20), ?)''',
+            [
+                (user_id, offer['lzt_item_id'], offer['g2g_offer_id'],
+                 offer['title'], offer['price'], offer.get('lzt_price'),
+                 offer.get('markup_percent'), offer['category'])
+                for offer in offers
+            ]
         )
-        await db.commit()
+    return len(offers)
 
 async def get_user_active_offers(user_id: int):
     """Получает активные офферы пользователя"""
-    async with aiosqlite.connect('database.db') as db:
+    async with db_pool.read() as db:
         cursor = await db.execute(
-            "SELECT * FROM user_offers WHERE user_id = ? AND status = 'active'",
+            f"SELECT {UserOffer.COLUMNS} FROM user_offers WHERE user_id = ? AND status = 'active'",
             (user_id,)
         )
-        return await cursor.fetchall()
+        return [UserOffer.from_row(row) for row in await cursor.fetchall()]
 
-async def get_offer_by_g2g_id(g2g_offer_id: str):
-    """Находит оффер по G2G ID"""
-    async with aiosqlite.connect('database.db') as db:
+async def get_offer_by_g2g_id(user_id: int, g2g_offer_id: str):
+    """Находит оффер пользователя по G2G ID"""
+    async with db_pool.read() as db:
         cursor = await db.execute(
-            "SELECT * FROM user_offers WHERE g2g_offer_id = ?",
-            (g2g_offer_id,)
+            f"SELECT {UserOffer.COLUMNS} FROM user_offers WHERE user_id = ? AND g2g_offer_id = ?",
+            (user_id, g2g_offer_id)
         )
-        return await cursor.fetchone()
+        return UserOffer.from_row(await cursor.fetchone())
 
 async def update_offer_status(offer_id: int, status: str):
     """Обновляет статус оффера"""
-    async with aiosqlite.connect('database.db') as db:
-        await db.execute(
+    await update_offer_statuses_bulk([(offer_id, status)])
+
+async def update_offer_statuses_bulk(updates: list):
+    """Обновляет статусы нескольких офферов одной транзакцией: [(offer_id, status), ...]"""
+    if not updates:
+        return
+    
+    updated_at = datetime.now().isoformat()
+    async with db_pool.write() as db:
+        await db.executemany(
             "UPDATE user_offers SET status = ?, updated_at = ? WHERE id = ?",
-            (status, datetime.now().isoformat(), offer_id)
+            [(status, updated_at, offer_id) for offer_id, status in updates]
+        )
+
+async def get_known_lzt_item_ids(user_id: int, lzt_item_ids: list) -> set:
+    """Возвращает те LZT item_id, по которым у пользователя уже есть офферы"""
+    if not lzt_item_ids:
+        return set()
+    
+    async with db_pool.read() as db:
+        placeholders = ", ".join("?" for _ in lzt_item_ids)
+        cursor = await db.execute(
+            f"SELECT lzt_item_id FROM user_offers WHERE user_id = ? AND lzt_item_id IN ({placeholders})",
+            [user_id] + [str(item_id) for item_id in lzt_item_ids]
+        )
+        return {row[0] for row in await cursor.fetchall()}
+
+# ===== SYNC CURSORS METHODS =====
+async def get_sync_cursor(user_id: int, category: str):
+    """Получает курсор синхронизации категории: (last_published_date, last_item_id)"""
+    async with db_pool.read() as db:
+        cursor = await db.execute(
+            "SELECT last_published_date, last_item_id FROM lzt_sync_cursors WHERE user_id = ? AND category = ?",
+            (user_id, category)
+        )
+        row = await cursor.fetchone()
+        return (row[0], row[1]) if row else (0, 0)
+
+async def update_sync_cursor(user_id: int, category: str, last_published_date: int, last_item_id: int):
+    """Сдвигает курсор синхронизации категории"""
+    async with db_pool.write() as db:
+        await db.execute(
+            '''INSERT INTO lzt_sync_cursors 
+            (user_id, category, last_published_date, last_item_id, updated_at) 
+            VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT (user_id, category) DO UPDATE SET 
+            last_published_date = excluded.last_published_date, 
+            last_item_id = excluded.last_item_id, 
+            updated_at = excluded.updated_at''',
+            (user_id, category, last_published_date, last_item_id, datetime.now().isoformat())
+        )
+
+# ===== DAILY QUOTA METHODS =====
+async def reserve_daily_quota(user_id: int, day: str, limit: int, count: int = 1) -> bool:
+    """Атомарно занимает count мест в квоте дня; False, если квота исчерпана"""
+    async with db_pool.write() as db:
+        # Проверка и увеличение счетчика - один оператор, параллельные воркеры не превысят лимит
+        cursor = await db.execute(
+            '''INSERT INTO user_daily_quota (user_id, day, used)
+            SELECT ?, ?, ? WHERE ? <= ?
+            ON CONFLICT (user_id, day) DO UPDATE SET used = used + excluded.used
+            WHERE used + excluded.used <= ?''',
+            (user_id, day, count, count, limit, limit)
+        )
+        return cursor.rowcount > 0
+
+async def release_daily_quota(user_id: int, day: str, count: int = 1):
+    """Возвращает в квоту места, занятые под неудавшиеся объявления"""
+    async with db_pool.write() as db:
+        await db.execute(
+            "UPDATE user_daily_quota SET used = MAX(used - ?, 0) WHERE user_id = ? AND day = ?",
+            (count, user_id, day)
+        )
+
+async def get_daily_quota_used(user_id: int, day: str) -> int:
+    """Сколько объявлений пользователь выставил за день"""
+    async with db_pool.read() as db:
+        cursor = await db.execute(
+            "SELECT used FROM user_daily_quota WHERE user_id = ? AND day = ?",
+            (user_id, day)
+        )
+        row = await cursor.fetchone()
+        return row[0] if row else 0
+
+async def prune_daily_quota(days: int):
+    """Удаляет счетчики старше days дней"""
+    async with db_pool.write() as db:
+        await db.execute(
+            "DELETE FROM user_daily_quota WHERE day < ?",
+            ((datetime.now() - timedelta(days=days)).date().isoformat(),)
         )
-        await db.commit()
 
 # ===== ORDERS METHODS =====
 async def create_order(user_id: int, offer_id: int, g2g_order_id: str, status: str = 'new'):
     """Создает запись о заказе"""
-    async with aiosqlite.connect('database.db') as db:
+    await upsert_orders_bulk([{
+        'user_id': user_id,
+        'offer_id': offer_id,
+        'g2g_order_id': g2g_order_id,
+        'status': status
+    }])
+
+async def upsert_orders_bulk(orders: list) -> int:
+    """Создает или обновляет заказы одной транзакцией (ключ - g2g_order_id)"""
+    if not orders:
+        return 0
+    
+    updated_at = datetime.now().isoformat()
+    async with db_pool.write() as db:
+        await db.executemany(
+            '''INSERT INTO user_orders 
+            (user_id, offer_id, g2g_order_id, status, amount, updated_at) 
+            VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT (g2g_order_id) DO UPDATE SET 
+            status = excluded.status, 
+            offer_id = COALESCE(excluded.offer_id, offer_id), 
+            amount = COALESCE(excluded.amount, amount), 
+            updated_at = excluded.updated_at''',
+            [
+                (order['user_id'], order.get('offer_id'), order['g2g_order_id'],
+                 order.get('status', 'new'), order.get('amount'), updated_at)
+                for order in orders
+            ]
+        )
+    return len(orders)
+
+async def get_order_by_g2g_id(g2g_order_id: str):
+    """Находит заказ по G2G ID"""
+    async with db_pool.read() as db:
+        cursor = await db.execute(
+            f"SELECT {UserOrder.COLUMNS} FROM user_orders WHERE g2g_order_id = ?",
+            (g2g_order_id,)
+        )
+        return UserOrder.from_row(await cursor.fetchone())
+
+async def save_order_purchase(user_id: int, offer_id: int, g2g_order_id: str, purchase_data: str):
+    """Запоминает покупку на LZT по заказу (данные уже зашифрованы), чтобы не купить повторно"""
+    async with db_pool.write() as db:
         await db.execute(
             '''INSERT INTO user_orders 
-            (user_id, offer_id, g2g_order_id, status) 
-            VALUES (?, ?, ?, ?)''',
-            (user_id, offer_id, g2g_order_id, status)
+            (user_id, offer_id, g2g_order_id, status, lzt_purchase_data, updated_at) 
+            VALUES (?, ?, ?, 'purchased', ?, ?)
+            ON CONFLICT (g2g_order_id) DO UPDATE SET 
+            status = excluded.status, 
+            lzt_purchase_data = excluded.lzt_purchase_data, 
+            updated_at = excluded.updated_at''',
+            (user_id, offer_id, g2g_order_id, purchase_data, datetime.now().isoformat())
         )
-        await db.commit()
+
+async def get_order_purchase_data(g2g_order_id: str):
+    """Зашифрованные данные купленного на LZT аккаунта или None"""
+    async with db_pool.read() as db:
+        cursor = await db.execute(
+            "SELECT lzt_purchase_data FROM user_orders WHERE g2g_order_id = ?",
+            (g2g_order_id,)
+        )
+        row = await cursor.fetchone()
+        return row[0] if row else None
 
 async def get_user_orders(user_id: int, status: str = None):
     """Получает заказы пользователя"""
-    async with aiosqlite.connect('database.db') as db:
+    async with db_pool.read() as db:
         if status:
             cursor = await db.execute(
-                "SELECT * FROM user_orders WHERE user_id = ? AND status = ?",
+                f"SELECT {UserOrder.COLUMNS} FROM user_orders WHERE user_id = ? AND status = ?",
                 (user_id, status)
             )
         else:
             cursor = await db.execute(
-                "SELECT * FROM user_orders WHERE user_id = ?",
+                f"SELECT {UserOrder.COLUMNS} FROM user_orders WHERE user_id = ?",
                 (user_id,)
             )
-        return await cursor.fetchall()
+        return [UserOrder.from_row(row) for row in await cursor.fetchall()]
 
 async def update_order_status(order_id: int, status: str):
     """Обновляет статус заказа"""
-    async with aiosqlite.connect('database.db') as db:
+    async with db_pool.write() as db:
         await db.execute(
             "UPDATE user_orders SET status = ?, updated_at = ? WHERE id = ?",
             (status, datetime.now().isoformat(), order_id)
         )
-        await db.commit()
 
-# ===== STATISTICS METHODS =====
-async def get_user_offers_stats(user_id: int):
-    """Статистика офферов пользователя"""
-    async with aiosqlite.connect('database.db') as db:
+# ===== ORDER JOBS METHODS =====
+async def _insert_order_job(db, user_id: int, g2g_order_id: str, payload: dict) -> bool:
+    cursor = await db.execute(
+        '''INSERT OR IGNORE INTO order_jobs 
+        (user_id, g2g_order_id, payload, next_run_at) 
+        VALUES (?, ?, ?, ?)''',
+        (user_id, g2g_order_id, json.dumps(payload), time.time())
+    )
+    return cursor.rowcount == 1
+
+async def enqueue_order_job(user_id: int, g2g_order_id: str, payload: dict) -> bool:
+    """Ставит заказ в очередь; False, если задача по этому заказу уже есть"""
+    async with db_pool.write() as db:
+        return await _insert_order_job(db, user_id, g2g_order_id, payload)
+
+async def claim_order_job(lease_seconds: float):
+    """Забирает одну готовую к запуску задачу (status -> running).
+
+    Задача, которая дольше lease_seconds остается running, считается брошенной
+    (воркер упал, не записав результат) и выдается снова.
+    """
+    stale_before = (datetime.now() - timedelta(seconds=lease_seconds)).isoformat()
+    # Под блокировкой писателя SELECT и UPDATE атомарны для всех воркеров
+    async with db_pool.write() as db:
         cursor = await db.execute(
-            "SELECT * FROM user_offers WHERE user_id = ?",
-            (user_id,)
+            f'''SELECT {OrderJob.COLUMNS} FROM order_jobs 
+            WHERE (status = 'pending' AND next_run_at <= ?) 
+            OR (status = 'running' AND updated_at < ?) 
+            ORDER BY next_run_at LIMIT 1''',
+            (time.time(), stale_before)
         )
-        offers = await cursor.fetchall()
+        job = OrderJob.from_row(await cursor.fetchone())
+        if job is None:
+            return None
         
-        active = len([o for o in offers if o[8] == 'active'])  # status field
-        sold = len([o for o in offers if o[8] == 'sold'])
-        
-        return {
-            'total': len(offers),
-            'active': active,
-            'sold': sold,
-            'limit': 20  # Будет зависеть от тарифа
-        }
+        job.status = 'running'
+        job.attempts += 1
+        await db.execute(
+            "UPDATE order_jobs SET status = ?, attempts = ?, updated_at = ? WHERE id = ?",
+            (job.status, job.attempts, datetime.now().isoformat(), job.id)
+        )
+        return job
 
-async def get_user_orders_stats(user_id: int):
-    """Статистика заказов пользователя"""
-    async with aiosqlite.connect('database.db') as db:
+# Записи воркера проверяют attempts: если аренда истекла и задачу забрал другой воркер,
+# attempts уже увеличен и запись прежнего владельца ничего не меняет
+
+async def renew_order_job(job_id: int, attempts: int) -> bool:
+    """Продлевает аренду задачи; False, если задача больше не принадлежит воркеру"""
+    async with db_pool.write() as db:
         cursor = await db.execute(
-            "SELECT * FROM user_orders WHERE user_id = ?",
-            (user_id,)
+            "UPDATE order_jobs SET updated_at = ? WHERE id = ? AND status = 'running' AND attempts = ?",
+            (datetime.now().isoformat(), job_id, attempts)
         )
-        orders = await cursor.fetchall()
-        
-        return {
-            'new': len([o for o in orders if o[4] == 'new']),
-            'processing': len([o for o in orders if o[4] == 'processing']),
-            'delivered': len([o for o in orders if o[4] == 'delivered']),
-            'cancelled': len([o for o in orders if o[4] == 'cancelled'])
-        }
\ No newline at end of file
+        return cursor.rowcount == 1
+
+async def finish_order_job(job_id: int, attempts: int, status: str, error: str = None) -> bool:
+    """Завершает задачу: done, failed (ошибка без повтора) или dead (исчерпаны попытки).
+    False, если аренда потеряна"""
+    async with db_pool.write() as db:
+        cursor = await db.execute(
+            '''UPDATE order_jobs SET status = ?, last_error = ?, updated_at = ? 
+            WHERE id = ? AND status = 'running' AND attempts = ?''',
+            (status, error, datetime.now().isoformat(), job_id, attempts)
+        )
+        return cursor.rowcount == 1
+
+async def retry_order_job(job_id: int, attempts: int, error: str, next_run_at: float) -> bool:
+    """Возвращает задачу в очередь с отложенным запуском; False, если аренда потеряна"""
+    async with db_pool.write() as db:
+        cursor = await db.execute(
+            '''UPDATE order_jobs SET status = 'pending', last_error = ?, next_run_at = ?, updated_at = ? 
+            WHERE id = ? AND status = 'running' AND attempts = ?''',
+            (error, next_run_at, datetime.now().isoformat(), job_id, attempts)
+        )
+        return cursor.rowcount == 1
+
+async def reset_running_order_jobs() -> int:
+    """Возвращает в очередь задачи, прерванные остановкой бота"""
+    async with db_pool.write() as db:
+        cursor = await db.execute(
+            "UPDATE order_jobs SET status = 'pending', next_run_at = ? WHERE status = 'running'",
+            (time.time(),)
+        )
+        return cursor.rowcount
+
+async def prune_order_jobs(days: int):
+    """Удаляет давно завершенные задачи (dead остаются для ручного разбора)"""
+    async with db_pool.write() as db:
+        await db.execute(
+            "DELETE FROM order_jobs WHERE status IN ('done', 'failed') AND updated_at < ?",
+            ((datetime.now() - timedelta(days=days)).isoformat(),)
+        )
+
+# ===== WEBHOOK EVENTS METHODS =====
+async def register_webhook_event(event_id: str, user_id: int, event_type: str,
+                                 order_data: dict = None) -> tuple:
+    """Запоминает событие вебхука и в той же транзакции ставит заказ order_data в очередь.
+
+    Возвращает (событие новое, задача создана). Если постановка в очередь упала,
+    событие тоже не сохраняется - повторная доставка G2G не будет считаться дубликатом.
+    """
+    async with db_pool.write() as db:
+        cursor = await db.execute(
+            '''INSERT OR IGNORE INTO g2g_webhook_events 
+            (event_id, user_id, event_type) 
+            VALUES (?, ?, ?)''',
+            (event_id, user_id, event_type)
+        )
+        if cursor.rowcount != 1:
+            return False, False
+        if order_data is None:
+            return True, False
+        return True, await _insert_order_job(db, user_id, str(order_data['order_id']), order_data)
+
+async def prune_webhook_events(days: int):
+    """Удаляет старые события вебхука - G2G не повторяет их так долго"""
+    async with db_pool.write() as db:
+        await db.execute(
+            "DELETE FROM g2g_webhook_events WHERE received_at < datetime('now', ?)",
+            (f"-{days} days",)
+        )
+
+# ===== STATISTICS METHODS =====
+async def _get_status_counters(user_id: int, entity: str) -> dict:
+    """Счетчики по статусам (таблица поддерживается триггерами)"""
+    async with db_pool.read() as db:
+        cursor = await db.execute(
+            "SELECT status, count FROM user_status_counters WHERE user_id = ? AND entity = ?",
+            (user_id, entity)
+        )
+        return {status: count for status, count in await cursor.fetchall()}
+
+async def get_user_offers_stats(user_id: int):
+    """Статистика офферов пользователя"""
+    counters = await _get_status_counters(user_id, 'offers')
+    
+    return {
+        'total': sum(counters.values()),
+        'active': counters.get('active', 0),
+        'sold': counters.get('sold', 0),
+        'limit': 20  # Будет зависеть от тарифа
+    }
+
+async def get_user_orders_stats(user_id: int):
+    """Статистика заказов пользователя"""
+    counters = await _get_status_counters(user_id, 'orders')
+    
+    return {
+        'new': counters.get('new', 0),
+        'processing': counters.get('processing', 0),
+        'delivered': counters.get('delivered', 0),
+        'cancelled': counters.get('cancelled', 0)
+    }
\ No newline at end of file
@@ -0,0 +1,167 @@
+# database/migrations.py
+import logging
+from database.connection import db_pool
+
+logger = logging.getLogger(__name__)
+
+def _counter_triggers(table: str, entity: str) -> list:
+    """Триггеры, поддерживающие user_status_counters в той же транзакции, что и запись"""
+    def increment(row: str) -> str:
+        return f'''INSERT INTO user_status_counters (user_id, entity, status, count)
+            VALUES ({row}.user_id, '{entity}', COALESCE({row}.status, ''), 1)
+            ON CONFLICT (user_id, entity, status) DO UPDATE SET count = count + 1;'''
+    
+    def decrement(row: str) -> str:
+        return f'''UPDATE user_status_counters SET count = count - 1
+            WHERE user_id = {row}.user_id AND entity = '{entity}' AND status = COALESCE({row}.status, '');'''
+    
+    return [
+        f'''CREATE TRIGGER IF NOT EXISTS trg_{table}_counters_insert AFTER INSERT ON {table}
+        BEGIN
+            {increment('NEW')}
+        END''',
+        f'''CREATE TRIGGER IF NOT EXISTS trg_{table}_counters_update AFTER UPDATE OF status, user_id ON {table}
+        WHEN OLD.status IS NOT NEW.status OR OLD.user_id IS NOT NEW.user_id
+        BEGIN
+            {decrement('OLD')}
+            {increment('NEW')}
+        END''',
+        f'''CREATE TRIGGER IF NOT EXISTS trg_{table}_counters_delete AFTER DELETE ON {table}
+        BEGIN
+            {decrement('OLD')}
+        END''',
+    ]
+
+# Версионированные миграции схемы. Текущая версия хранится в PRAGMA user_version.
+# Новые изменения схемы добавляются только в конец списка со следующим номером.
+MIGRATIONS = [
+    (1, "Индексы для горячих запросов и уникальный user_id в ключах и настройках", [
+        # Перед уникальными индексами убираем дубликаты (остается самая ранняя запись)
+        '''DELETE FROM user_api_keys WHERE id NOT IN (
+            SELECT MIN(id) FROM user_api_keys GROUP BY user_id
+        )''',
+        '''DELETE FROM user_settings WHERE id NOT IN (
+            SELECT MIN(id) FROM user_settings GROUP BY user_id
+        )''',
+        "CREATE UNIQUE INDEX IF NOT EXISTS ux_user_api_keys_user_id ON user_api_keys (user_id)",
+        "CREATE UNIQUE INDEX IF NOT EXISTS ux_user_settings_user_id ON user_settings (user_id)",
+        "CREATE INDEX IF NOT EXISTS ix_user_offers_g2g_offer_id ON user_offers (g2g_offer_id)",
+        "CREATE INDEX IF NOT EXISTS ix_user_offers_user_status ON user_offers (user_id, status)",
+        "CREATE INDEX IF NOT EXISTS ix_user_offers_user_lzt_item ON user_offers (user_id, lzt_item_id)",
+        "CREATE INDEX IF NOT EXISTS ix_user_orders_user_status ON user_orders (user_id, status)",
+        "CREATE INDEX IF NOT EXISTS ix_user_orders_g2g_order_id ON user_orders (g2g_order_id)",
+    ]),
+    (2, "Счетчики офферов и заказов по статусам, обновляемые триггерами", [
+        '''CREATE TABLE IF NOT EXISTS user_status_counters (
+            user_id INTEGER NOT NULL,
+            entity TEXT NOT NULL,
+            status TEXT NOT NULL,
+            count INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (user_id, entity, status)
+        ) WITHOUT ROWID''',
+        '''INSERT OR REPLACE INTO user_status_counters (user_id, entity, status, count)
+        SELECT user_id, 'offers', COALESCE(status, ''), COUNT(*) FROM user_offers GROUP BY user_id, COALESCE(status, '')''',
+        '''INSERT OR REPLACE INTO user_status_counters (user_id, entity, status, count)
+        SELECT user_id, 'orders', COALESCE(status, ''), COUNT(*) FROM user_orders GROUP BY user_id, COALESCE(status, '')''',
+        *_counter_triggers('user_offers', 'offers'),
+        *_counter_triggers('user_orders', 'orders'),
+    ]),
+    (3, "Уникальный g2g_order_id для пакетного upsert заказов", [
+        # Повторные записи одного заказа G2G схлопываем в самую раннюю
+        '''DELETE FROM user_orders WHERE g2g_order_id IS NOT NULL AND id NOT IN (
+            SELECT MIN(id) FROM user_orders WHERE g2g_order_id IS NOT NULL GROUP BY g2g_order_id
+        )''',
+        "DROP INDEX IF EXISTS ix_user_orders_g2g_order_id",
+        "CREATE UNIQUE INDEX IF NOT EXISTS ux_user_orders_g2g_order_id ON user_orders (g2g_order_id)",
+    ]),
+    (4, "Категории парсера в отдельной таблице вместо str(list) в настройках", [
+        '''CREATE TABLE IF NOT EXISTS user_categories (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            category TEXT NOT NULL,
+            created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+            UNIQUE (user_id, category),
+            FOREIGN KEY (user_id) REFERENCES users (id)
+        )''',
+        # parser_categories хранился как str(list): ['steam', 'lol'] - после замены ' на " это JSON
+        '''INSERT OR IGNORE INTO user_categories (user_id, category)
+        SELECT s.user_id, c.value
+        FROM user_settings s, json_each(REPLACE(s.parser_categories, char(39), char(34))) c
+        WHERE json_valid(REPLACE(s.parser_categories, char(39), char(34)))
+        ORDER BY s.user_id, c.key''',
+    ]),
+    (5, "Журнал событий вебхука G2G для дедупликации и поиск продавца по g2g_user_id", [
+        '''CREATE TABLE IF NOT EXISTS g2g_webhook_events (
+            event_id TEXT PRIMARY KEY,
+            user_id INTEGER NOT NULL,
+            event_type TEXT,
+            received_at TEXT DEFAULT CURRENT_TIMESTAMP
+        ) WITHOUT ROWID''',
+        "CREATE INDEX IF NOT EXISTS ix_g2g_webhook_events_received_at ON g2g_webhook_events (received_at)",
+        # По g2g_user_id вебхук выбирает продавца - один ID не может принадлежать двум пользователям.
+        # Неоднозначные ID сбрасываем: владелец введет G2G ключи заново
+        '''UPDATE user_api_keys SET g2g_user_id = NULL 
+        WHERE g2g_user_id IN (
+            SELECT g2g_user_id FROM user_api_keys 
+            WHERE g2g_user_id IS NOT NULL GROUP BY g2g_user_id HAVING COUNT(*) > 1
+        )''',
+        "CREATE UNIQUE INDEX IF NOT EXISTS ix_user_api_keys_g2g_user_id ON user_api_keys (g2g_user_id)",
+    ]),
+    (6, "Очередь обработки заказов с ключом идемпотентности g2g_order_id", [
+        '''CREATE TABLE IF NOT EXISTS order_jobs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            g2g_order_id TEXT NOT NULL UNIQUE,
+            payload TEXT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'pending',
+            attempts INTEGER NOT NULL DEFAULT 0,
+            next_run_at REAL NOT NULL DEFAULT 0,
+            last_error TEXT,
+            created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+            updated_at TEXT DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users (id)
+        )''',
+        "CREATE INDEX IF NOT EXISTS ix_order_jobs_status_next_run ON order_jobs (status, next_run_at)",
+    ]),
+    (7, "Дневные счетчики выставленных объявлений для квот тарифов", [
+        '''CREATE TABLE IF NOT EXISTS user_daily_quota (
+            user_id INTEGER NOT NULL,
+            day TEXT NOT NULL,
+            used INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (user_id, day)
+        ) WITHOUT ROWID''',
+        # Офферы, созданные сегодня до миграции, уже занимают квоту
+        '''INSERT OR IGNORE INTO user_daily_quota (user_id, day, used)
+        SELECT user_id, date(created_at, 'localtime'), COUNT(*) FROM user_offers
+        WHERE date(created_at, 'localtime') = date('now', 'localtime')
+        GROUP BY user_id''',
+    ]),
+    (8, "Себестоимость LZT в офферах и наценка по категориям", [
+        "ALTER TABLE user_offers ADD COLUMN lzt_price REAL",
+        "ALTER TABLE user_categories ADD COLUMN markup_percent INTEGER",
+    ]),
+]
+
+async def get_schema_version() -> int:
+    """Текущая версия схемы БД"""
+    async with db_pool.read() as db:
+        cursor = await db.execute("PRAGMA user_version")
+        row = await cursor.fetchone()
+        return row[0]
+
+async def run_migrations():
+    """Применяет к существующей БД все миграции новее ее версии"""
+    version = await get_schema_version()
+
+    for migration_version, description, statements in MIGRATIONS:
+        if migration_version <= version:
+            continue
+
+        # Каждая миграция - одна транзакция вместе с новым номером версии
+        async with db_pool.write() as db:
+            await db.execute("BEGIN")
+            for statement in statements:
+                await db.execute(statement)
+            await db.execute(f"PRAGMA user_version = {migration_version}")
+
+        logger.info(f"✅ Migration {migration_version} applied: {description}")
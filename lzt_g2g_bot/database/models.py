@@ -0,0 +1,86 @@
+# database/models.py
+from dataclasses import dataclass, fields
+from typing import ClassVar, Optional
+
+class RowModel:
+    """Базовый класс строк БД: список колонок и сборка из кортежа"""
+    __slots__ = ()
+    COLUMNS: ClassVar[str] = ""
+
+    @classmethod
+    def from_row(cls, row):
+        return cls(*row) if row is not None else None
+
+def _columns(model) -> str:
+    return ", ".join(f.name for f in fields(model))
+
+@dataclass(slots=True)
+class User(RowModel):
+    id: int
+    telegram_id: int
+    username: Optional[str]
+    first_name: Optional[str]
+    last_name: Optional[str]
+    subscription_type: str
+    subscription_expiry: Optional[str]
+    is_active: bool
+
+@dataclass(slots=True)
+class UserApiKeys(RowModel):
+    id: int
+    user_id: int
+    lzt_token: Optional[str]
+    g2g_api_key: Optional[str]
+    g2g_secret: Optional[str]
+    g2g_user_id: Optional[str]
+    is_active: bool
+    last_checked: Optional[str]
+
+@dataclass(slots=True)
+class UserSettings(RowModel):
+    id: int
+    user_id: int
+    markup_percent: int
+    markup_fixed: int
+    price_min: int
+    price_max: int
+    account_age_filter: str
+    last_activity_filter: str
+
+@dataclass(slots=True)
+class UserOffer(RowModel):
+    id: int
+    user_id: int
+    lzt_item_id: Optional[str]
+    g2g_offer_id: Optional[str]
+    title: Optional[str]
+    price: Optional[float]
+    markup_percent: int
+    category: Optional[str]
+    status: str
+    created_at: Optional[str]
+    lzt_price: Optional[float]
+
+@dataclass(slots=True)
+class UserOrder(RowModel):
+    id: int
+    user_id: int
+    offer_id: Optional[int]
+    g2g_order_id: Optional[str]
+    status: str
+    amount: Optional[float]
+    created_at: Optional[str]
+
+@dataclass(slots=True)
+class OrderJob(RowModel):
+    id: int
+    user_id: int
+    g2g_order_id: str
+    payload: str
+    status: str
+    attempts: int
+    next_run_at: float
+    last_error: Optional[str]
+
+for _model in (User, UserApiKeys, UserSettings, UserOffer, UserOrder, OrderJob):
+    _model.COLUMNS = _columns(_model)
@@ -0,0 +1,68 @@
+# database/user_cache.py
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, Optional
+from config import config
+
+# Поле еще не загружено из БД (None - валидное значение: ключей может не быть)
+MISSING = object()
+
+@dataclass(slots=True)
+class UserContext:
+    """Закэшированные данные одного пользователя"""
+    user: Any = MISSING
+    settings: Any = MISSING
+    api_keys: Any = MISSING
+    categories: Any = MISSING
+
+class UserCache:
+    """LRU кэш пользователей, их настроек и API ключей; crud пишет в него сквозной записью"""
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._items: OrderedDict = OrderedDict()  # user_id -> UserContext
+        self._by_telegram_id: Dict[int, int] = {}
+
+    def get_user_id(self, telegram_id: int) -> Optional[int]:
+        """Внутренний id пользователя по telegram_id, если он в кэше"""
+        return self._by_telegram_id.get(telegram_id)
+
+    def get(self, user_id: int, field: str):
+        """Значение поля контекста или MISSING"""
+        context = self._items.get(user_id)
+        if context is None:
+            return MISSING
+
+        self._items.move_to_end(user_id)
+        return getattr(context, field)
+
+    def set(self, user_id: int, field: str, value, overwrite: bool = True):
+        """Сохраняет поле контекста.
+
+        Чтения из БД передают overwrite=False: если запись успела обновить кэш,
+        пока шел SELECT, прочитанное значение уже устарело.
+        """
+        context = self._items.get(user_id)
+        if context is None:
+            context = UserContext()
+            self._items[user_id] = context
+        elif not overwrite and getattr(context, field) is not MISSING:
+            return
+
+        setattr(context, field, value)
+        if field == 'user' and value is not None:
+            self._by_telegram_id[value.telegram_id] = user_id
+
+        self._items.move_to_end(user_id)
+        while len(self._items) > self.max_size:
+            _, evicted = self._items.popitem(last=False)
+            if evicted.user is not MISSING and evicted.user is not None:
+                self._by_telegram_id.pop(evicted.user.telegram_id, None)
+
+    def invalidate(self, user_id: int):
+        """Удаляет пользователя из кэша"""
+        context = self._items.pop(user_id, None)
+        if context is not None and context.user is not MISSING and context.user is not None:
+            self._by_telegram_id.pop(context.user.telegram_id, None)
+
+user_cache = UserCache(config.USER_CACHE_SIZE)
@@ -4,7 +4,8 @@ from aiogram.filters import StateFilter
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
 
-from database.crud import get_or_create_user, save_lzt_token, save_g2g_keys, get_user_api_keys
+from database.crud import save_lzt_token, save_g2g_keys, get_user_api_keys
+from database.models import User
 from services.lzt_api import test_lzt_connection
 from services.g2g_api import test_g2g_connection
 from services.encryption import encryption_service
@@ -19,25 +20,18 @@ class APIStates(StatesGroup):
     waiting_g2g_user_id = State()
 
 @router.message(F.text == "🔑 НАСТРОИТЬ API КЛЮЧИ")
-async def api_setup_menu(message: Message):
+async def api_setup_menu(message: Message, user: User):
     """Меню настройки API ключей"""
-    user = await get_or_create_user(
-        telegram_id=message.from_user.id,
-        username=message.from_user.username,
-        first_name=message.from_user.first_name,
-        last_name=message.from_user.last_name
-    )
-    
-    api_keys = await get_user_api_keys(user[0])  # user[0] - это id
+    api_keys = await get_user_api_keys(user.id)
     
     status_text = "📊 СТАТУС API:\n"
     
-    if api_keys and api_keys[2]:  # api_keys[2] - lzt_token
+    if api_keys and api_keys.lzt_token:
         status_text += "✅ LZT API: Настроено\n"
     else:
         status_text += "❌ LZT API: Не настроено\n"
         
-    if api_keys and api_keys[3]:  # api_keys[3] - g2g_api_key
+    if api_keys and api_keys.g2g_api_key:
         status_text += "✅ G2G API: Настроено\n"
     else:
         status_text += "❌ G2G API: Не настроено\n"
@@ -70,7 +64,7 @@ async def setup_lzt_start(callback: CallbackQuery, state: FSMContext):
     await callback.answer()
 
 @router.message(APIStates.waiting_lzt_token)
-async def process_lzt_token(message: Message, state: FSMContext):
+async def process_lzt_token(message: Message, state: FSMContext, user: User):
     """Обработка LZT токена"""
     token = message.text.strip()
     
@@ -78,16 +72,9 @@ async def process_lzt_token(message: Message, state: FSMContext):
     is_valid = await test_lzt_connection(token)
     
     if is_valid:
-        user = await get_or_create_user(
-            telegram_id=message.from_user.id,
-            username=message.from_user.username,
-            first_name=message.from_user.first_name,
-            last_name=message.from_user.last_name
-        )
-        
         # Шифруем и сохраняем токен
         encrypted_token = encryption_service.encrypt(token)
-        await save_lzt_token(user[0], encrypted_token)
+        await save_lzt_token(user.id, encrypted_token)
     
         success_text = """
 ✅ LZT API УСПЕШНО НАСТРОЕНО!
@@ -148,7 +135,7 @@ async def process_g2g_secret(message: Message, state: FSMContext):
     await state.set_state(APIStates.waiting_g2g_user_id)
 
 @router.message(APIStates.waiting_g2g_user_id)
-async def process_g2g_user_id(message: Message, state: FSMContext):
+async def process_g2g_user_id(message: Message, state: FSMContext, user: User):
     """Обработка G2G User ID и сохранение всех данных"""
     user_id = message.text.strip()
     data = await state.get_data()
@@ -160,18 +147,16 @@ async def process_g2g_user_id(message: Message, state: FSMContext):
     is_valid = await test_g2g_connection(api_key, secret, user_id)
     
     if is_valid:
-        user = await get_or_create_user(
-            telegram_id=message.from_user.id,
-            username=message.from_user.username,
-            first_name=message.from_user.first_name,
-            last_name=message.from_user.last_name
-        )
-        
         # Шифруем и сохраняем ключи
         encrypted_api_key = encryption_service.encrypt(api_key)
         encrypted_secret = encryption_service.encrypt(secret)
         
-        await save_g2g_keys(user[0], encrypted_api_key, encrypted_secret, user_id)
+        if not await save_g2g_keys(user.id, encrypted_api_key, encrypted_secret, user_id):
+            await message.answer(
+                "❌ Этот G2G User ID уже привязан к другому аккаунту бота. Введите другой:",
+                reply_markup=get_back_keyboard()
+            )
+            return
     
         success_text = """
 ✅ G2G API УСПЕШНО НАСТРОЕНО!
@@ -196,33 +181,27 @@ async def process_g2g_user_id(message: Message, state: FSMContext):
     await state.clear()
 
 @router.callback_query(F.data == "check_all_apis")
-async def check_all_apis(callback: CallbackQuery):
+async def check_all_apis(callback: CallbackQuery, user: User):
     """Проверка всех API подключений"""
-    user = await get_or_create_user(
-        telegram_id=callback.from_user.id,
-        username=callback.from_user.username,
-        first_name=callback.from_user.first_name,
-        last_name=callback.from_user.last_name
-    )
-    
-    api_keys = await get_user_api_keys(user[0])
+    api_keys = await get_user_api_keys(user.id)
     status_text = "🔍 ПРОВЕРКА API ПОДКЛЮЧЕНИЙ:\n\n"
     
-    if api_keys and api_keys[2]:  # lzt_token
+    if api_keys and api_keys.lzt_token:
         try:
-            decrypted_token = encryption_service.decrypt(api_keys[2])
-            lzt_valid = await test_lzt_connection(decrypted_token)
+            credentials = encryption_service.get_credentials(user.id, api_keys)
+            lzt_valid = await test_lzt_connection(credentials['lzt_token'])
             status_text += "✅ LZT API: Работает\n" if lzt_valid else "❌ LZT API: Ошибка\n"
         except:
             status_text += "❌ LZT API: Ошибка дешифровки\n"
     else:
         status_text += "❌ LZT API: Не настроено\n"
         
-    if api_keys and api_keys[3]:  # g2g_api_key
+    if api_keys and api_keys.g2g_api_key:
         try:
-            decrypted_api_key = encryption_service.decrypt(api_keys[3])
-            decrypted_secret = encryption_service.decrypt(api_keys[4])
-            g2g_valid = await test_g2g_connection(decrypted_api_key, decrypted_secret, api_keys[5])
+            credentials = encryption_service.get_credentials(user.id, api_keys)
+            g2g_valid = await test_g2g_connection(
+                credentials['g2g_api_key'], credentials['g2g_secret'], credentials['g2g_user_id']
+            )
             status_text += "✅ G2G API: Работает\n" if g2g_valid else "❌ G2G API: Ошибка\n"
         except:
             status_text += "❌ G2G API: Ошибка дешифровки\n"
@@ -1,8 +1,11 @@
 from aiogram import Router, F
-from aiogram.types import Message, CallbackQuery
+from aiogram.types import Message, CallbackQuery, InlineKeyboardButton
 from aiogram.utils.keyboard import InlineKeyboardBuilder
-from database.crud import get_or_create_user, get_user_api_keys, get_user_settings, create_user_offer, get_user_active_offers
-import asyncio
+from config import config
+from database.crud import get_user_api_keys, get_user_settings, get_user_categories, get_user_active_offers
+from database.models import User
+from services.daily_quota import DailyQuota
+from services.posting_scheduler import posting_scheduler
 
 router = Router()
 
@@ -34,21 +37,15 @@ def get_auto_posting_keyboard(is_active: bool = False):
     return builder.as_markup()
 
 @router.message(F.text == "🔄 АВТОСИНХРОНИЗАЦИЯ")
-async def auto_posting_menu(message: Message):
-    user = await get_or_create_user(
-        telegram_id=message.from_user.id,
-        username=message.from_user.username,
-        first_name=message.from_user.first_name,
-        last_name=message.from_user.last_name
-    )
+async def auto_posting_menu(message: Message, user: User):
+    api_keys = await get_user_api_keys(user.id)
+    settings = await get_user_settings(user.id)
+    active_offers = await get_user_active_offers(user.id)
+    quota = DailyQuota(user.id, user.subscription_type)
     
-    api_keys = await get_user_api_keys(user[0])
-    settings = await get_user_settings(user[0])
-    active_offers = await get_user_active_offers(user[0])
-    
-    has_lzt = bool(api_keys and api_keys[2])
-    has_g2g = bool(api_keys and api_keys[3])
-    categories = eval(settings[3]) if settings and settings[3] else []
+    has_lzt = bool(api_keys and api_keys.lzt_token)
+    has_g2g = bool(api_keys and api_keys.g2g_api_key)
+    categories = await get_user_categories(user.id)
     
     menu_text = f"""
 🔄 АВТОМАТИЧЕСКАЯ СИНХРОНИЗАЦИЯ LZT → G2G
@@ -57,8 +54,9 @@ async def auto_posting_menu(message: Message):
 • LZT API: {'✅ Настроено' if has_lzt else '❌ Не настроено'}
 • G2G API: {'✅ Настроено' if has_g2g else '❌ Не настроено'}
 • Категории: {len(categories)} выбрано
-• Наценка: {settings[2] if settings else 20}%
+• Наценка: {settings.markup_percent if settings else 20}%
 • Активных объявлений: {len(active_offers)}
+• Выставлено сегодня: {await quota.used()}/{quota.limit}
 
 🚀 Функции:
 • Автопарсинг новых аккаунтов с LZT
@@ -70,60 +68,32 @@ async def auto_posting_menu(message: Message):
     await message.answer(menu_text, reply_markup=get_auto_posting_keyboard())
 
 @router.callback_query(F.data == "start_auto_posting")
-async def start_auto_posting(callback: CallbackQuery):
-    user = await get_or_create_user(
-        telegram_id=callback.from_user.id,
-        username=callback.from_user.username,
-        first_name=callback.from_user.first_name,
-        last_name=callback.from_user.last_name
-    )
-    
-    api_keys = await get_user_api_keys(user[0])
-    settings = await get_user_settings(user[0])
+async def start_auto_posting(callback: CallbackQuery, user: User):
+    api_keys = await get_user_api_keys(user.id)
+    settings = await get_user_settings(user.id)
+    categories = await get_user_categories(user.id)
     
-    if not api_keys or not api_keys[2] or not api_keys[3]:
+    if not api_keys or not api_keys.lzt_token or not api_keys.g2g_api_key:
         await callback.answer("❌ Сначала настройте LZT и G2G API!")
         return
     
-    if not settings or not settings[3] or settings[3] == "[]":
+    if not settings or not categories:
         await callback.answer("❌ Сначала выберите категории в настройках парсера!")
         return
     
-    await callback.message.answer("🚀 Запускаю автоматическую синхронизацию...")
-    
-    # Имитация работы авто-постинга
-    progress_msg = await callback.message.answer("🔄 Парсинг LZT...")
-    await asyncio.sleep(1)
-    
-    await progress_msg.edit_text("🔄 Создание объявлений на G2G...")
-    await asyncio.sleep(1)
-    
-    # Создаем тестовые офферы
-    categories = eval(settings[3])
-    for i, category in enumerate(categories[:3]):
-        await create_user_offer(
-            user_id=user[0],
-            lzt_item_id=f"test_lzt_{i}",
-            g2g_offer_id=f"test_g2g_{i}",
-            title=f"Test {LZT_CATEGORIES.get(category, category)} Account",
-            price=25.99 + i * 5,
-            category=category
-        )
-        await asyncio.sleep(0.5)
-    
-    await progress_msg.edit_text("✅ Авто-синхронизация запущена!")
+    # Запуск вне очереди: планировщик выполнит его, как только освободится слот
+    posting_scheduler.request_run(user.id)
     
     result_text = f"""
 ✅ АВТО-СИНХРОНИЗАЦИЯ ЗАПУЩЕНА
 
 📊 Статус:
-• Парсинг LZT: 🟢 Активен
+• Парсинг LZT: 🟢 Каждые {config.AUTO_POST_USER_INTERVAL_MINUTES} мин
 • Создание офферов G2G: 🟢 Активно
-• Проверка заказов: 🟢 Каждые 5 мин
-• Создано объявлений: 3
+• Проверка заказов: 🟢 Активна
 
-🎯 Категории: {', '.join([LZT_CATEGORIES.get(cat, cat) for cat in categories[:3]])}
-💰 Наценка: {settings[2]}%
+🎯 Категории: {', '.join([LZT_CATEGORIES.get(cat, cat) for cat in categories])}
+💰 Наценка: {settings.markup_percent}%
 
 💡 Система автоматически:
 1. Ищет новые аккаунты на LZT по выбранным категориям
@@ -136,16 +106,10 @@ async def start_auto_posting(callback: CallbackQuery):
     await callback.answer("Авто-синхронизация запущена!")
 
 @router.callback_query(F.data == "posting_stats")
-async def show_posting_stats(callback: CallbackQuery):
-    user = await get_or_create_user(
-        telegram_id=callback.from_user.id,
-        username=callback.from_user.username,
-        first_name=callback.from_user.first_name,
-        last_name=callback.from_user.last_name
-    )
-    
-    active_offers = await get_user_active_offers(user[0])
-    settings = await get_user_settings(user[0])
+async def show_posting_stats(callback: CallbackQuery, user: User):
+    active_offers = await get_user_active_offers(user.id)
+    settings = await get_user_settings(user.id)
+    categories = await get_user_categories(user.id)
     
     stats_text = f"""
 📊 СТАТИСТИКА АВТО-СИНХРОНИЗАЦИИ
@@ -157,15 +121,15 @@ async def show_posting_stats(callback: CallbackQuery):
 • Доход: $0.00
 
 ⚙️ Настройки:
-• Наценка: {settings[2] if settings else 20}%
-• Категории: {len(eval(settings[3])) if settings and settings[3] else 0}
-• Ценовой диапазон: ${settings[5] if settings else 1} - ${settings[6] if settings else 100}
+• Наценка: {settings.markup_percent if settings else 20}%
+• Категории: {len(categories)}
+• Ценовой диапазон: ${settings.price_min if settings else 1} - ${settings.price_max if settings else 100}
 
 📋 Активные объявления:
 """
     
     for i, offer in enumerate(active_offers[:5]):
-        stats_text += f"• {offer[4]} - ${offer[5]}\n"
+        stats_text += f"• {offer.title} - ${offer.price}\n"
     
     if len(active_offers) > 5:
         stats_text += f"• ... и еще {len(active_offers) - 5} объявлений\n"
@@ -1,7 +1,6 @@
 from aiogram import Router, F
-from aiogram.types import Message, CallbackQuery
+from aiogram.types import Message, CallbackQuery, InlineKeyboardButton
 from aiogram.utils.keyboard import InlineKeyboardBuilder
-from database.crud import get_or_create_user
 import random
 from datetime import datetime, timedelta
 
@@ -40,13 +39,6 @@ def generate_mock_orders():
 
 @router.message(F.text == "📦 ЗАКАЗЫ G2G")
 async def orders_menu(message: Message):
-    user = await get_or_create_user(
-        telegram_id=message.from_user.id,
-        username=message.from_user.username,
-        first_name=message.from_user.first_name,
-        last_name=message.from_user.last_name
-    )
-    
     mock_orders = generate_mock_orders()
     
     new_orders = [o for o in mock_orders if o['status'] == 'new']
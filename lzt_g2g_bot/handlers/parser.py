@@ -1,10 +1,14 @@
 from aiogram import Router, F
-from aiogram.types import Message, CallbackQuery
+from aiogram.types import Message, CallbackQuery, InlineKeyboardButton
 from aiogram.filters import StateFilter
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
 from aiogram.utils.keyboard import InlineKeyboardBuilder
-from database.crud import get_or_create_user, get_user_settings, update_user_settings
+from database.crud import (
+    get_user_settings, update_user_settings, get_user_categories, toggle_user_category,
+    get_category_markups, set_category_markup
+)
+from database.models import User
 import asyncio
 
 router = Router()
@@ -59,34 +63,26 @@ def get_parser_keyboard(selected_categories: list = None):
     return builder.as_markup()
 
 @router.message(F.text == "🎯 НАСТРОИТЬ ПАРСЕР")
-async def parser_menu(message: Message):
-    user = await get_or_create_user(
-        telegram_id=message.from_user.id,
-        username=message.from_user.username,
-        first_name=message.from_user.first_name,
-        last_name=message.from_user.last_name
+async def parser_menu(message: Message, user: User):
+    settings = await get_user_settings(user.id)
+    selected_cats = await get_user_categories(user.id)
+    category_markups = await get_category_markups(user.id)
+    
+    markup = settings.markup_percent if settings else 20
+    markup_overrides = "".join(
+        f"\n  ◦ {LZT_CATEGORIES.get(category, category)}: {percent}%"
+        for category, percent in category_markups.items()
     )
-    
-    settings = await get_user_settings(user[0])
-    
-    selected_cats = []
-    if settings and settings[3]:  # parser_categories
-        try:
-            selected_cats = eval(settings[3])
-        except:
-            selected_cats = []
-    
-    markup = settings[2] if settings else 20
-    price_min = settings[5] if settings else 1
-    price_max = settings[6] if settings else 100
-    activity = settings[8] if settings else '7'
-    age = settings[7] if settings else 'any'
+    price_min = settings.price_min if settings else 1
+    price_max = settings.price_max if settings else 100
+    activity = settings.last_activity_filter if settings else '7'
+    age = settings.account_age_filter if settings else 'any'
     
     menu_text = f"""
 🎯 НАСТРОЙКА ПАРСЕРА LZT
 
 📊 Текущие настройки:
-• Наценка: {markup}%
+• Наценка: {markup}%{markup_overrides}
 • Мин. цена: ${price_min}
 • Макс. цена: ${price_max}
 • Отлежка: {activity}+ дней
@@ -97,65 +93,53 @@ async def parser_menu(message: Message):
     await message.answer(menu_text, reply_markup=get_parser_keyboard(selected_cats))
 
 @router.callback_query(F.data.startswith("cat_"))
-async def toggle_category(callback: CallbackQuery):
+async def toggle_category(callback: CallbackQuery, user: User):
     category_id = callback.data.replace("cat_", "")
     
-    user = await get_or_create_user(
-        telegram_id=callback.from_user.id,
-        username=callback.from_user.username,
-        first_name=callback.from_user.first_name,
-        last_name=callback.from_user.last_name
-    )
-    
-    settings = await get_user_settings(user[0])
-    
-    current_cats = []
-    if settings and settings[3]:
-        try:
-            current_cats = eval(settings[3])
-        except:
-            current_cats = []
-    
-    if category_id in current_cats:
-        current_cats.remove(category_id)
-    else:
-        current_cats.append(category_id)
-    
-    await update_user_settings(user[0], {"parser_categories": str(current_cats)})
+    # Одна транзакция: добавить или убрать категорию и вернуть новый список
+    current_cats = await toggle_user_category(user.id, category_id)
     
     await callback.message.edit_reply_markup(reply_markup=get_parser_keyboard(current_cats))
     await callback.answer()
 
 @router.callback_query(F.data == "set_markup")
 async def set_markup_start(callback: CallbackQuery, state: FSMContext):
-    await callback.message.answer("💯 Введите процент наценки (например: 20):")
+    await callback.message.answer(
+        "💯 Введите процент наценки (например: 20)\n"
+        "или наценку для выбранной категории: steam 30 (steam - - вернуть общую):"
+    )
     await state.set_state(ParserStates.waiting_markup)
     await callback.answer()
 
 @router.message(ParserStates.waiting_markup)
-async def process_markup(message: Message, state: FSMContext):
+async def process_markup(message: Message, state: FSMContext, user: User):
+    parts = message.text.strip().split()
+    category = parts[0] if len(parts) == 2 else None
     try:
-        markup = int(message.text.strip())
-        if markup < 1 or markup > 500:
-            await message.answer("❌ Наценка должна быть от 1% до 500%. Попробуйте еще раз:")
-            return
-        
-        user = await get_or_create_user(
-            telegram_id=message.from_user.id,
-            username=message.from_user.username,
-            first_name=message.from_user.first_name,
-            last_name=message.from_user.last_name
-        )
-        
-        await update_user_settings(user[0], {"markup_percent": markup})
-        
+        markup = None if category and parts[1] == "-" else int(parts[-1])
+        if len(parts) not in (1, 2):
+            raise ValueError
+    except (ValueError, IndexError):
+        await message.answer("❌ Введите число или категорию и число. Попробуйте еще раз:")
+        return
+    
+    if markup is not None and (markup < 1 or markup > 500):
+        await message.answer("❌ Наценка должна быть от 1% до 500%. Попробуйте еще раз:")
+        return
+    
+    if category is None:
+        await update_user_settings(user.id, {"markup_percent": markup})
         await message.answer(f"✅ Наценка установлена: {markup}%")
-        await parser_menu(message)
-        
-    except ValueError:
-        await message.answer("❌ Введите число. Попробуйте еще раз:")
+    elif await set_category_markup(user.id, category, markup):
+        name = LZT_CATEGORIES.get(category, category)
+        await message.answer(
+            f"✅ Наценка для {name}: {markup}%" if markup is not None else f"✅ {name}: общая наценка"
+        )
+    else:
+        await message.answer("❌ Сначала выберите эту категорию в парсере. Попробуйте еще раз:")
         return
     
+    await parser_menu(message, user)
     await state.clear()
 
 @router.callback_query(F.data == "set_price_range")
@@ -181,7 +165,7 @@ async def process_price_min(message: Message, state: FSMContext):
         return
 
 @router.message(ParserStates.waiting_price_max)
-async def process_price_max(message: Message, state: FSMContext):
+async def process_price_max(message: Message, state: FSMContext, user: User):
     try:
         price_max = int(message.text.strip())
         data = await state.get_data()
@@ -191,20 +175,13 @@ async def process_price_max(message: Message, state: FSMContext):
             await message.answer("❌ Максимальная цена должна быть больше минимальной. Попробуйте еще раз:")
             return
         
-        user = await get_or_create_user(
-            telegram_id=message.from_user.id,
-            username=message.from_user.username,
-            first_name=message.from_user.first_name,
-            last_name=message.from_user.last_name
-        )
-        
-        await update_user_settings(user[0], {
+        await update_user_settings(user.id, {
             "price_min": price_min,
             "price_max": price_max
         })
         
         await message.answer(f"✅ Ценовой диапазон установлен: ${price_min} - ${price_max}")
-        await parser_menu(message)
+        await parser_menu(message, user)
         
     except ValueError:
         await message.answer("❌ Введите число. Попробуйте еще раз:")
@@ -213,17 +190,11 @@ async def process_price_max(message: Message, state: FSMContext):
     await state.clear()
 
 @router.callback_query(F.data == "start_parsing")
-async def start_parsing(callback: CallbackQuery):
-    user = await get_or_create_user(
-        telegram_id=callback.from_user.id,
-        username=callback.from_user.username,
-        first_name=callback.from_user.first_name, 
-        last_name=callback.from_user.last_name
-    )
-    
-    settings = await get_user_settings(user[0])
+async def start_parsing(callback: CallbackQuery, user: User):
+    settings = await get_user_settings(user.id)
+    categories = await get_user_categories(user.id)
     
-    if not settings or not settings[3] or settings[3] == "[]":
+    if not settings or not categories:
         await callback.answer("❌ Сначала выберите категории для парсинга!")
         return
     
@@ -233,17 +204,16 @@ async def start_parsing(callback: CallbackQuery):
     await asyncio.sleep(2)
     
     found_count = 8  # Заглушка
-    categories = eval(settings[3]) if settings and settings[3] else []
     
     result_text = f"""
 📊 РЕЗУЛЬТАТЫ ПАРСИНГА
 
 ✅ Найдено аккаунтов: {found_count}
 🎯 Категории: {', '.join([LZT_CATEGORIES.get(cat, cat) for cat in categories[:3]])}
-💰 Диапазон цен: ${settings[5] if settings else 1} - ${settings[6] if settings else 100}
+💰 Диапазон цен: ${settings.price_min if settings else 1} - ${settings.price_max if settings else 100}
 ⏰ Время выполнения: 2.8 сек
 
-💡 Найденные аккаунты будут автоматически размещены на G2G с наценкой {settings[2] if settings else 20}%
+💡 Найденные аккаунты будут автоматически размещены на G2G с наценкой {settings.markup_percent if settings else 20}%
 """
     await callback.message.answer(result_text)
     await callback.answer("Парсинг завершен!")
\ No newline at end of file
@@ -1,7 +1,8 @@
 from aiogram import Router, F
 from aiogram.types import Message, CallbackQuery, InlineKeyboardButton
 from aiogram.utils.keyboard import InlineKeyboardBuilder
-from database.crud import get_or_create_user, update_subscription
+from database.crud import update_subscription
+from database.models import User
 from datetime import datetime, timedelta
 
 router = Router()
@@ -57,15 +58,8 @@ def get_subscription_keyboard():
     return builder.as_markup()
 
 @router.message(F.text == "💳 ВЫБРАТЬ ТАРИФ")
-async def subscription_menu(message: Message):
-    user = await get_or_create_user(
-        telegram_id=message.from_user.id,
-        username=message.from_user.username,
-        first_name=message.from_user.first_name, 
-        last_name=message.from_user.last_name
-    )
-    
-    current_plan = SUBSCRIPTION_PLANS.get(user[6], {}).get('name', 'Базовый') if user else 'Базовый'
+async def subscription_menu(message: Message, user: User):
+    current_plan = SUBSCRIPTION_PLANS.get(user.subscription_type, {}).get('name', 'Базовый') if user else 'Базовый'
     
     menu_text = f"""
 💳 ВЫБОР ТАРИФА
@@ -6,14 +6,21 @@ from aiogram.enums import ParseMode
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 
 from config import config
-from database import init_db
+from database import init_db, close_db
+from database.crud import rotate_encrypted_data
 from handlers.start import router as start_router
 from handlers.api_setup import router as api_router
 from handlers.subscriptions import router as subscriptions_router
 from handlers.parser import router as parser_router
 from handlers.auto_posting import router as auto_posting_router
 from handlers.orders import router as orders_router
-from services.order_checker import check_pending_orders
+from services.order_checker import check_pending_orders, get_order_check_interval
+from services.order_queue import order_queue
+from services.posting_scheduler import posting_scheduler
+from services.webhook_server import webhook_server
+from services.http_client import http_client
+from services.encryption import encryption_service
+from utils.middlewares import UserMiddleware
 
 # Настройка логирования
 logging.basicConfig(
@@ -29,10 +36,25 @@ async def main():
         await init_db()
         logger.info("✅ Database initialized")
         
+        # Ключи шифрования выводятся до запуска бота, а не на первом запросе
+        await encryption_service.load_keys()
+        rotated = await rotate_encrypted_data()
+        if rotated:
+            logger.info(f"🔑 Re-encrypted {rotated} records with key {config.ENCRYPTION_KEY_ID}")
+        logger.info("✅ Encryption keys loaded")
+        
+        # Общий пул HTTP соединений для LZT и G2G
+        await http_client.start(config.LZT_API_URL, config.G2G_API_URL)
+        logger.info("✅ HTTP client started")
+        
         # Создание бота и диспетчера
         bot = Bot(token=config.BOT_TOKEN, default=DefaultBotProperties(parse_mode=ParseMode.HTML))
         dp = Dispatcher()
         
+        # Пользователь из кэша передается во все хендлеры
+        dp.message.middleware(UserMiddleware())
+        dp.callback_query.middleware(UserMiddleware())
+        
         # Регистрация ВСЕХ роутеров
         dp.include_router(start_router)
         dp.include_router(api_router)
@@ -41,16 +63,32 @@ async def main():
         dp.include_router(auto_posting_router)
         dp.include_router(orders_router)
         
-        # Запускаем планировщик для проверки заказов каждые 5 минут
+        # Воркеры обработки заказов: их наполняют вебхук и сверка
+        await order_queue.start(bot)
+        logger.info(f"✅ Order queue started ({config.ORDER_WORKERS} workers)")
+        
+        # Вебхук G2G - заказы обрабатываются сразу после оплаты
+        if config.G2G_WEBHOOK_ENABLED:
+            await webhook_server.start()
+            logger.info(f"✅ G2G webhook listening on {config.G2G_WEBHOOK_HOST}:{config.G2G_WEBHOOK_PORT}{config.G2G_WEBHOOK_PATH}")
+        
+        # Автопостинг всех пользователей с ключами и категориями
+        await posting_scheduler.start()
+        logger.info(f"✅ Auto-posting scheduler started ({config.AUTO_POST_CONCURRENCY} concurrent runs)")
+        
+        # Опрос G2G: без вебхука - основной источник заказов, с ним - редкая сверка
+        check_interval = get_order_check_interval()
         scheduler = AsyncIOScheduler()
         scheduler.add_job(
             check_pending_orders,
             'interval',
-            minutes=5,  # 🔄 Каждые 5 минут!
-            args=[bot]
+            minutes=check_interval,
+            args=[bot],
+            max_instances=1,
+            coalesce=True
         )
         scheduler.start()
-        logger.info("✅ Order checker scheduler started (every 5 minutes)")
+        logger.info(f"✅ Order checker scheduler started (every {check_interval} minutes)")
         
         # Запуск бота
         logger.info("✅ Bot starting...")
@@ -59,6 +97,12 @@ async def main():
     except Exception as e:
         logger.error(f"❌ Bot crashed: {e}")
         raise
+    finally:
+        await webhook_server.close()
+        await posting_scheduler.stop()
+        await order_queue.stop()
+        await http_client.close()
+        await close_db()
 
 if __name__ == "__main__":
     asyncio.run(main())
\ No newline at end of file
@@ -1,158 +1,296 @@
 import asyncio
-from typing import List, Dict
-from services.lzt_api import get_lzt_accounts, get_lzt_account_details
+import json
+import logging
+from dataclasses import dataclass
+from typing import Any, List, Dict, Optional, Set, Tuple
+from config import config
+from services.lzt_api import get_lzt_account_details, lzt_search_params
+from services.listing_sync import ListingSync
 from services.g2g_api import create_g2g_offer
 from services.encryption import encryption_service
-from database.crud import get_user_api_keys, get_user_settings, create_user_offer, get_user_active_offers
-from templates.steam import create_steam_offer
-from templates.valorant import create_valorant_offer
-from templates.lol import create_lol_offer
-from templates.genshin import create_genshin_offer
-from templates.honkai import create_honkai_offer
-from templates.zzz import create_zzz_offer
-from templates.minecraft import create_minecraft_offer
-from templates.brawl_stars import create_brawl_stars_offer
-from templates.clash_of_clans import create_clash_of_clans_offer
+from services.pipeline import Pipeline, Stage
+from services.daily_quota import DailyQuota
+from services.template_engine import template_engine
+from services.template_registry import template_registry
+from services.pricing import Pricer, parse_cost, from_cents
+from services.filters import FilterChain, compile_filters
+from database.crud import get_user_by_id, get_user_api_keys, get_user_settings, get_user_categories, get_category_markups, create_user_offers_bulk
+
+logger = logging.getLogger(__name__)
+
+@dataclass(slots=True)
+class Listing:
+    """Объявление LZT, проходящее через конвейер автопостинга"""
+    category: str
+    account: Dict
+    details: Optional[Dict] = None
+    template: Optional[Dict] = None
+    # Себестоимость на LZT в центах
+    cost: Optional[int] = None
+    g2g_offer_id: Any = None
 
 class AutoPoster:
-    def __init__(self, db, user_id: int):
-        self.db = db
+    """Автопостинг LZT -> G2G конвейером: листинг -> детали -> фильтры -> шаблон -> G2G -> БД"""
+    
+    def __init__(self, user_id: int):
         self.user_id = user_id
+        self.listing_sync = ListingSync(user_id)
         self.stats = {
             'parsed': 0,
             'posted': 0,
+            'filtered': 0,
             'errors': 0
         }
+        # Записи в БД копятся и сохраняются пачками одной транзакцией
+        self.pending_offers: List[Dict] = []
+        # Новые объявления категорий (от старых к новым) и уже обработанные из них:
+        # курсор двигается только по непрерывно обработанному началу списка
+        self.category_listings: Dict[str, List[Dict]] = {}
+        self.handled: Set[Tuple[str, Any]] = set()
+        # Опубликованные на G2G, но еще не переданные в pending_offers объявления
+        # и незавершенные запросы публикации (запрос -> объявление и день квоты)
+        self.published: Dict[Tuple[str, Any], Listing] = {}
+        self.publishing: Dict[asyncio.Future, Tuple[Listing, str]] = {}
+        self.quota: Optional[DailyQuota] = None
+        self.settings = None
+        self.pricer: Optional[Pricer] = None
+        self.filters: Optional[FilterChain] = None
+        self.credentials: Dict[str, str] = {}
+        self.pipeline: Optional[Pipeline] = None
     
     async def run_auto_posting(self) -> Dict:
         """Запуск автоматического создания объявлений"""
         # Получаем настройки и ключи
-        settings = await get_user_settings(self.db, self.user_id)
-        api_keys = await get_user_api_keys(self.db, self.user_id)
+        settings = await get_user_settings(self.user_id)
+        api_keys = await get_user_api_keys(self.user_id)
         
         if not settings or not api_keys:
             return self.stats
         
-        # Проверяем лимиты тарифа
-        active_offers = await get_user_active_offers(self.db, self.user_id)
-        if len(active_offers) >= self.get_daily_limit(settings.subscription_type):
+        # Проверяем дневную квоту тарифа
+        user = await get_user_by_id(self.user_id)
+        self.quota = DailyQuota(self.user_id, user.subscription_type)
+        if await self.quota.remaining() <= 0:
             return {'error': 'Достигнут дневной лимит объявлений'}
         
         # Дешифруем ключи
-        lzt_token = encryption_service.decrypt(api_keys.lzt_token)
-        g2g_api_key = encryption_service.decrypt(api_keys.g2g_api_key)
-        g2g_secret = encryption_service.decrypt(api_keys.g2g_secret)
-        g2g_user_id = api_keys.g2g_user_id
+        self.settings = settings
+        self.pricer = Pricer(settings, await get_category_markups(self.user_id))
+        self.filters = compile_filters(settings)
+        self.credentials = encryption_service.get_credentials(self.user_id, api_keys)
         
         # Парсим аккаунты с LZT
-        categories = eval(settings.parser_categories) if settings.parser_categories else []
+        categories = await get_user_categories(self.user_id)
+        
+        self.pipeline = Pipeline([
+            Stage('fetch', self.fetch_listings, config.AUTO_POST_FETCH_CONCURRENCY, fan_out=True),
+            Stage('details', self.fetch_details, config.LZT_DETAILS_CONCURRENCY),
+            Stage('filter', self.filter_listing),
+            Stage('template', self.build_template),
+            Stage('publish', self.publish_offer, config.AUTO_POST_PUBLISH_CONCURRENCY),
+            # Уже созданные на G2G офферы сохраняются и после остановки конвейера
+            Stage('persist', self.persist_offer, stoppable=False),
+        ], queue_size=config.AUTO_POST_QUEUE_SIZE)
         
-        for category in categories:
-            await self.process_category(category, settings, lzt_token, g2g_api_key, g2g_secret, g2g_user_id)
+        try:
+            await self.pipeline.run(categories)
+        finally:
+            # Офферы уже созданы на G2G - сохраняем их даже после ошибки
+            await self.flush()
         
+        stages = self.pipeline.metrics()
+        self.stats['filtered'] = sum(self.filters.rejected.values())
+        self.stats['errors'] += sum(stage['errors'] for stage in stages.values())
+        self.stats['stages'] = stages
         return self.stats
     
-    async def process_category(self, category: str, settings, lzt_token: str, 
-                            g2g_api_key: str, g2g_secret: str, g2g_user_id: str):
-        """Обрабатывает категорию и создает объявления"""
-        params = {
-            "pmin": settings.price_min,
-            "pmax": settings.price_max,
-            "parse_sticky_items": True
-        }
-        
-        accounts = await get_lzt_accounts(category, params, lzt_token)
+    async def fetch_listings(self, category: str) -> List[Listing]:
+        """Стадия 1: новые объявления категории после прошлой синхронизации"""
+        params = lzt_search_params(self.settings, category)
+        accounts = await self.listing_sync.fetch_new_accounts(category, params, self.credentials['lzt_token'])
+        self.category_listings[category] = accounts
         self.stats['parsed'] += len(accounts)
         
-        for account in accounts[:5]:  # Ограничиваем для начала
-            if self.stats['posted'] >= 3:  # Максимум 3 объявления за раз
-                break
-                
+        # Фильтры по полям листинга - до запроса деталей
+        listings = []
+        for account in accounts:
+            listing = Listing(category, account)
+            if self.filters.matches(account):
+                listings.append(listing)
+            else:
+                self.mark_handled(listing)
+        return listings
+    
+    async def fetch_details(self, listing: Listing) -> Optional[Listing]:
+        """Стадия 2: детали аккаунта; темп задает лимит LZT"""
+        details = await get_lzt_account_details(listing.account['item_id'], self.credentials['lzt_token'])
+        if not details:
+            self.stats['errors'] += 1
+            return None
+        
+        listing.details = details
+        return listing
+    
+    async def filter_listing(self, listing: Listing) -> Optional[Listing]:
+        """Стадия 3: фильтры по полям, которых не было в листинге"""
+        if not self.filters.matches(listing.details):
+            self.mark_handled(listing)
+            return None
+        return listing
+    
+    async def build_template(self, listing: Listing) -> Optional[Listing]:
+        """Стадия 4: шаблон объявления G2G"""
+        # Без цены оффер ушел бы на G2G за $0: берем цену из листинга, иначе отбрасываем
+        cost = parse_cost(listing.details.get('price') or listing.account.get('price'))
+        if cost is None:
+            logger.warning(f"⚠️ LZT item {listing.account['item_id']} has no valid price, skipped")
+            self.stats['errors'] += 1
+            self.mark_handled(listing)
+            return None
+        
+        listing.cost = cost
+        final_price = from_cents(self.pricer.price(cost, listing.category))
+        template = self.create_offer_template(listing.details, final_price)
+        if not template:
+            self.mark_handled(listing)
+            return None
+        
+        listing.template = template
+        return listing
+    
+    async def publish_offer(self, listing: Listing) -> Optional[Listing]:
+        """Стадия 5: создание объявления на G2G в пределах дневной квоты"""
+        # Место в квоте занимаем до запроса, чтобы параллельные воркеры не превысили ее
+        quota_day = await self.quota.reserve()
+        if quota_day is None:
+            self.pipeline.stop()
+            return None
+        
+        # Отмена запуска (таймаут) не прерывает запрос: G2G мог уже создать оффер,
+        # и без записи в БД он остался бы неучтенным. Незавершенные запросы дожидается flush()
+        publish = asyncio.ensure_future(create_g2g_offer(
+            self.credentials['g2g_api_key'],
+            self.credentials['g2g_secret'],
+            self.credentials['g2g_user_id'],
+            listing.template['offer_data']
+        ))
+        self.publishing[publish] = (listing, quota_day)
+        await asyncio.wait((publish,))
+        del self.publishing[publish]
+        return await self.complete_publish(listing, quota_day, publish)
+    
+    async def complete_publish(self, listing: Listing, quota_day: str, publish: asyncio.Future) -> Optional[Listing]:
+        """Результат запроса публикации: место в квоте освобождается, если оффер не создан"""
+        error = publish.exception()
+        result = None if error else publish.result()
+        if not result:
+            await self.quota.release(quota_day)
+            if error:
+                raise error
+            self.stats['errors'] += 1
+            return None
+        
+        listing.g2g_offer_id = result.get('id')
+        self.stats['posted'] += 1
+        self.published[(listing.category, listing.account['item_id'])] = listing
+        return listing
+    
+    async def persist_offer(self, listing: Listing) -> None:
+        """Стадия 6: запись в БД пачками"""
+        self.add_offer(listing)
+        if len(self.pending_offers) >= config.AUTO_POST_PERSIST_BATCH:
+            offers, self.pending_offers = self.pending_offers, []
             try:
-                # Получаем детали аккаунта
-                details = await get_lzt_account_details(account['item_id'], lzt_token)
-                
-                # Применяем фильтры
-                if not self.apply_filters(details, settings):
-                    continue
-                
-                # Создаем шаблон для G2G
-                template = self.create_offer_template(details, settings.markup_percent)
-                if not template:
-                    continue
-                
-                # Создаем объявление на G2G
-                result = await create_g2g_offer(g2g_api_key, g2g_secret, g2g_user_id, template['offer_data'])
-                
-                if result:
-                    # Сохраняем в БД
-                    await create_user_offer(
-                        self.db, 
-                        self.user_id,
-                        details['item_id'],
-                        result.get('id'),
-                        template['title'],
-                        template['price'],
-                        category
-                    )
-                    self.stats['posted'] += 1
-                else:
-                    self.stats['errors'] += 1
-                    
-                await asyncio.sleep(2)  # Задержка между запросами
-                
-            except Exception as e:
-                print(f"Error processing account: {e}")
-                self.stats['errors'] += 1
-                continue
+                await self.save_offers(offers)
+            except asyncio.CancelledError:
+                # Запуск отменен во время записи - пачку сохранит flush()
+                self.pending_offers[:0] = offers
+                raise
     
-    def apply_filters(self, account_details: Dict, settings) -> bool:
-        """Применяет фильтры к аккаунту"""
-        # Фильтр по отлежке
-        last_activity = account_details.get('last_activity')
-        if last_activity and settings.last_activity_filter != 'any':
-            # Логика проверки отлежки
-            pass
-        
-        # Фильтр по давности выставления
-        created_time = account_details.get('created_time')
-        if created_time and settings.account_age_filter != 'any':
-            # Логика проверки давности
-            pass
-        
-        return True
+    def add_offer(self, listing: Listing):
+        """Передает опубликованное объявление на запись; после нее курсор может пройти дальше"""
+        self.published.pop((listing.category, listing.account['item_id']), None)
+        self.pending_offers.append({
+            'lzt_item_id': listing.details['item_id'],
+            'g2g_offer_id': listing.g2g_offer_id,
+            'title': listing.template['title'],
+            'price': listing.template['price'],
+            # Себестоимость нужна для покупки на LZT при продаже и для переоценки
+            'lzt_price': from_cents(listing.cost),
+            'markup_percent': self.pricer.rule(listing.category).markup_percent,
+            'category': listing.category
+        })
+        self.mark_handled(listing)
     
-    def create_offer_template(self, account_details: Dict, markup_percent: int) -> Dict:
-        """Создает шаблон объявления в зависимости от категории"""
-        category_name = account_details.get('category', {}).get('name', '').lower()
-        
-        if 'steam' in category_name:
-            return create_steam_offer(account_details, markup_percent)
-        elif 'valorant' in category_name:
-            return create_valorant_offer(account_details, markup_percent)
-        elif 'league' in category_name or 'lol' in category_name:
-            return create_lol_offer(account_details, markup_percent)
-        elif 'genshin' in category_name:
-            return create_genshin_offer(account_details, markup_percent)
-        elif 'honkai' in category_name:
-            return create_honkai_offer(account_details, markup_percent)
-        elif 'zenless' in category_name:
-            return create_zzz_offer(account_details, markup_percent)
-        elif 'minecraft' in category_name:
-            return create_minecraft_offer(account_details, markup_percent)
-        elif 'brawl' in category_name:
-            return create_brawl_stars_offer(account_details, markup_percent)
-        elif 'clash' in category_name:
-            return create_clash_of_clans_offer(account_details, markup_percent)
-        
-        return None
+    def mark_handled(self, listing: Listing):
+        """Объявление обработано окончательно и не нужно в следующем запуске"""
+        self.handled.add((listing.category, listing.account['item_id']))
     
-    def get_daily_limit(self, subscription_type: str) -> int:
-        """Возвращает дневной лимит по тарифу"""
-        limits = {
-            'basic': 20,
-            'premium': 50,
-            'pro': 100,
-            'owner': 9999
-        }
-        return limits.get(subscription_type, 20)
\ No newline at end of file
+    async def save_offers(self, offers: List[Dict]):
+        """Записывает офферы в БД с повторами.
+        
+        Офферы уже опубликованы на G2G: если запись так и не удалась, их ID уходят
+        в лог для сверки - без записи в user_offers заказы по ним не найдутся.
+        """
+        if not offers:
+            return
+        
+        for attempt in range(1, config.AUTO_POST_PERSIST_RETRIES + 1):
+            try:
+                await create_user_offers_bulk(self.user_id, offers)
+                return
+            except Exception as e:
+                error = e
+                if attempt < config.AUTO_POST_PERSIST_RETRIES:
+                    logger.warning(f"⚠️ Saving {len(offers)} offers of user {self.user_id} failed (attempt {attempt}): {e}")
+                    await asyncio.sleep(config.AUTO_POST_PERSIST_RETRY_DELAY * attempt)
+        
+        self.stats['errors'] += len(offers)
+        published = [
+            {'g2g_offer_id': offer['g2g_offer_id'], 'lzt_item_id': offer['lzt_item_id'], 'category': offer['category']}
+            for offer in offers
+        ]
+        logger.error(
+            f"❌ {len(offers)} offers of user {self.user_id} are live on G2G but not saved ({error}), "
+            f"reconcile manually: {json.dumps(published)}"
+        )
+    
+    async def flush(self):
+        """Сохраняет оставшиеся офферы и сдвигает курсоры синхронизации"""
+        # После отмены запуска часть опубликованных объявлений не дошла до стадии записи:
+        # дожидаемся начатых публикаций и забираем все опубликованное
+        if self.publishing:
+            await asyncio.wait(list(self.publishing))
+            for publish, (listing, quota_day) in list(self.publishing.items()):
+                try:
+                    await self.complete_publish(listing, quota_day, publish)
+                except Exception as e:
+                    self.stats['errors'] += 1
+                    logger.error(f"G2G publish of LZT item {listing.account['item_id']} failed: {e}")
+            self.publishing.clear()
+        for listing in list(self.published.values()):
+            self.add_offer(listing)
+        
+        offers, self.pending_offers = self.pending_offers, []
+        await self.save_offers(offers)
+        
+        # Курсоры двигаем после записи офферов; если запись не удалась, ID офферов
+        # уже в логе, а повторная публикация создала бы на G2G дубликаты.
+        # После первого необработанного объявления курсор не двигается, чтобы оно
+        # попало в следующий запуск
+        for category, accounts in self.category_listings.items():
+            last_handled = None
+            for account in accounts:
+                if (category, account['item_id']) not in self.handled:
+                    break
+                last_handled = account
+            if last_handled:
+                await self.listing_sync.commit(category, last_handled)
+        self.category_listings = {}
+    
+    def create_offer_template(self, account_details: Dict, final_price: float) -> Optional[Dict]:
+        """Создает шаблон объявления по category_id аккаунта"""
+        template_name = template_registry.resolve(account_details)
+        if template_name is None:
+            return None
+        return template_engine.render(template_name, account_details, final_price)
@@ -0,0 +1,42 @@
+# services/daily_quota.py
+from datetime import date
+from typing import Optional
+from config import config
+from database.crud import reserve_daily_quota, release_daily_quota, get_daily_quota_used
+
+def get_daily_limit(subscription_type: str) -> int:
+    """Возвращает дневной лимит объявлений по тарифу"""
+    return config.DAILY_POST_LIMITS.get(subscription_type, config.DAILY_POST_LIMITS['basic'])
+
+class DailyQuota:
+    """Дневная квота объявлений пользователя: счетчик за день в user_daily_quota.
+
+    Место занимается до создания оффера на G2G и возвращается при неудаче,
+    поэтому параллельные воркеры и запуски не выставляют больше лимита тарифа.
+    """
+
+    def __init__(self, user_id: int, subscription_type: str):
+        self.user_id = user_id
+        self.limit = get_daily_limit(subscription_type)
+
+    @staticmethod
+    def today() -> str:
+        return date.today().isoformat()
+
+    async def used(self) -> int:
+        return await get_daily_quota_used(self.user_id, self.today())
+
+    async def remaining(self) -> int:
+        return max(0, self.limit - await self.used())
+
+    async def reserve(self) -> Optional[str]:
+        """Занимает место в квоте; возвращает день резерва или None, если квота исчерпана"""
+        # День запоминаем: возврат после полуночи должен попасть в тот же счетчик
+        day = self.today()
+        if await reserve_daily_quota(self.user_id, day, self.limit):
+            return day
+        return None
+
+    async def release(self, day: str):
+        """Возвращает место, если оффер так и не был создан"""
+        await release_daily_quota(self.user_id, day)
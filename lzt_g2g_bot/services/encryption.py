@@ -1,36 +1,189 @@
-from cryptography.fernet import Fernet
+from cryptography.fernet import Fernet, MultiFernet
 from cryptography.hazmat.primitives import hashes
 from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
+import asyncio
 import base64
+import hashlib
+import json
 import os
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
 from config import config
 
+class CredentialCache:
+    """LRU кэш расшифрованных ключей пользователей с TTL"""
+    
+    def __init__(self, max_size: int, ttl: int):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._items: OrderedDict = OrderedDict()
+    
+    def get(self, user_id: int) -> Optional[Dict[str, str]]:
+        item = self._items.get(user_id)
+        if item is None:
+            return None
+        
+        expires_at, credentials = item
+        if expires_at < time.monotonic():
+            del self._items[user_id]
+            return None
+        
+        self._items.move_to_end(user_id)
+        return credentials
+    
+    def set(self, user_id: int, credentials: Dict[str, str]):
+        self._items[user_id] = (time.monotonic() + self.ttl, credentials)
+        self._items.move_to_end(user_id)
+        while len(self._items) > self.max_size:
+            self._items.popitem(last=False)
+    
+    def invalidate(self, user_id: int):
+        self._items.pop(user_id, None)
+
 class EncryptionService:
+    SALT = b'lzt_g2g_bot_salt_2024'
+    
     def __init__(self):
-        self.key = self._generate_key()
+        # Ключи выводятся лениво при первом использовании, а не при импорте
+        self._fernets: Dict[str, Fernet] = {}
+        self._multi_fernet: Optional[MultiFernet] = None
+        self.credentials_cache = CredentialCache(
+            config.CREDENTIALS_CACHE_SIZE,
+            config.CREDENTIALS_CACHE_TTL
+        )
+    
+    def _passwords(self) -> Dict[str, str]:
+        """Все известные пароли: текущий и старые (для ротации)"""
+        passwords = dict(config.ENCRYPTION_OLD_KEYS)
+        passwords[config.ENCRYPTION_KEY_ID] = config.ENCRYPTION_KEY
+        return passwords
+    
+    def _fingerprint(self, password: str) -> str:
+        return hashlib.sha256(self.SALT + password.encode()).hexdigest()[:16]
+    
+    def _load_cached_keys(self) -> Dict[str, dict]:
+        try:
+            with open(config.ENCRYPTION_KEY_CACHE_FILE) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+    
+    def _save_cached_keys(self, cached: Dict[str, dict]):
+        try:
+            fd = os.open(config.ENCRYPTION_KEY_CACHE_FILE, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with os.fdopen(fd, 'w') as f:
+                json.dump(cached, f)
+        except OSError:
+            pass
     
-    def _generate_key(self) -> bytes:
-        """Генерирует ключ шифрования на основе ENCRYPTION_KEY"""
-        password = config.ENCRYPTION_KEY.encode()
-        salt = b'lzt_g2g_bot_salt_2024'
+    def _generate_key(self, password: str) -> bytes:
+        """Генерирует ключ шифрования на основе пароля"""
         kdf = PBKDF2HMAC(
             algorithm=hashes.SHA256(),
             length=32,
-            salt=salt,
+            salt=self.SALT,
             iterations=100000,
         )
-        return base64.urlsafe_b64encode(kdf.derive(password))
+        return base64.urlsafe_b64encode(kdf.derive(password.encode()))
+    
+    def _get_key(self, key_id: str) -> bytes:
+        """Ключ по ID: из переменной окружения, файла кэша или через PBKDF2"""
+        if key_id == config.ENCRYPTION_KEY_ID and config.ENCRYPTION_DERIVED_KEY:
+            return config.ENCRYPTION_DERIVED_KEY.encode()
+        
+        password = self._passwords()[key_id]
+        fingerprint = self._fingerprint(password)
+        cached = self._load_cached_keys()
+        entry = cached.get(key_id)
+        if entry and entry.get('fingerprint') == fingerprint:
+            return entry['key'].encode()
+        
+        key = self._generate_key(password)
+        cached[key_id] = {'fingerprint': fingerprint, 'key': key.decode()}
+        self._save_cached_keys(cached)
+        return key
+    
+    def _get_fernet(self, key_id: str) -> Fernet:
+        fernet = self._fernets.get(key_id)
+        if fernet is None:
+            fernet = Fernet(self._get_key(key_id))
+            self._fernets[key_id] = fernet
+        return fernet
+    
+    async def load_keys(self):
+        """Выводит все ключи при старте в отдельном потоке: PBKDF2 - это сотни миллисекунд CPU,
+        которые при ленивом выводе блокировали бы event loop на первом запросе"""
+        await asyncio.to_thread(lambda: self.multi_fernet)
+    
+    @property
+    def key(self) -> bytes:
+        """Текущий ключ шифрования"""
+        return self._get_key(config.ENCRYPTION_KEY_ID)
+    
+    @property
+    def fernet(self) -> Fernet:
+        """Fernet текущего ключа"""
+        return self._get_fernet(config.ENCRYPTION_KEY_ID)
+    
+    @property
+    def multi_fernet(self) -> MultiFernet:
+        """MultiFernet по всем ключам - для данных без ID ключа"""
+        if self._multi_fernet is None:
+            key_ids = [config.ENCRYPTION_KEY_ID] + [
+                key_id for key_id in config.ENCRYPTION_OLD_KEYS if key_id != config.ENCRYPTION_KEY_ID
+            ]
+            self._multi_fernet = MultiFernet([self._get_fernet(key_id) for key_id in key_ids])
+        return self._multi_fernet
     
     def encrypt(self, data: str) -> str:
-        """Шифрует данные"""
-        fernet = Fernet(self.key)
-        encrypted = fernet.encrypt(data.encode())
-        return encrypted.decode()
+        """Шифрует данные (с префиксом ID ключа)"""
+        encrypted = self.fernet.encrypt(data.encode())
+        return f"{config.ENCRYPTION_KEY_ID}:{encrypted.decode()}"
     
     def decrypt(self, encrypted_data: str) -> str:
         """Расшифровывает данные"""
-        fernet = Fernet(self.key)
-        decrypted = fernet.decrypt(encrypted_data.encode())
+        key_id, sep, token = encrypted_data.partition(':')
+        if sep and key_id in self._passwords():
+            decrypted = self._get_fernet(key_id).decrypt(token.encode())
+        else:
+            # Старый формат без ID ключа - перебираем все ключи
+            decrypted = self.multi_fernet.decrypt(encrypted_data.encode())
         return decrypted.decode()
+    
+    def needs_rotation(self, encrypted_data: str) -> bool:
+        """Зашифровано ли значение не текущим ключом"""
+        return not encrypted_data.startswith(f"{config.ENCRYPTION_KEY_ID}:")
+    
+    def rotate(self, encrypted_data: str) -> str:
+        """Перешифровывает значение текущим ключом"""
+        if not self.needs_rotation(encrypted_data):
+            return encrypted_data
+        return self.encrypt(self.decrypt(encrypted_data))
+    
+    def rotate_values(self, values: list) -> Optional[list]:
+        """Перешифровывает значения строки текущим ключом; None, если менять нечего"""
+        if not any(value and self.needs_rotation(value) for value in values):
+            return None
+        return [self.rotate(value) if value else value for value in values]
+    
+    def get_credentials(self, user_id: int, api_keys) -> Dict[str, str]:
+        """Возвращает расшифрованные ключи пользователя (из кэша, если есть)"""
+        credentials = self.credentials_cache.get(user_id)
+        if credentials is not None:
+            return credentials
+        
+        credentials = {
+            'lzt_token': self.decrypt(api_keys.lzt_token) if api_keys.lzt_token else None,
+            'g2g_api_key': self.decrypt(api_keys.g2g_api_key) if api_keys.g2g_api_key else None,
+            'g2g_secret': self.decrypt(api_keys.g2g_secret) if api_keys.g2g_secret else None,
+            'g2g_user_id': api_keys.g2g_user_id
+        }
+        self.credentials_cache.set(user_id, credentials)
+        return credentials
+    
+    def invalidate_credentials(self, user_id: int):
+        """Сбрасывает кэш ключей пользователя (после их изменения)"""
+        self.credentials_cache.invalidate(user_id)
 
 encryption_service = EncryptionService()
\ No newline at end of file
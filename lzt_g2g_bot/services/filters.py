@@ -0,0 +1,93 @@
+# services/filters.py
+import time
+from collections import Counter
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+DAY = 86400
+
+@dataclass(frozen=True, slots=True)
+class Predicate:
+    """Одна проверка объявления: поля LZT (первое заполненное) и условие на значение"""
+    name: str
+    fields: Tuple[str, ...]
+    test: Callable[[float], bool]
+
+    def value(self, item: Dict) -> Any:
+        for field in self.fields:
+            value = item.get(field)
+            if value not in (None, ''):
+                return value
+        return None
+
+class FilterChain:
+    """Фильтры пользователя, собранные один раз за запуск в упорядоченную цепочку.
+
+    Объявление из листинга LZT содержит почти все поля деталей, поэтому цепочка
+    сначала применяется к нему - отклоненные объявления не стоят запроса деталей.
+    Поле, которого нет в данных, не отклоняет объявление: оно проверяется на
+    деталях, а если его нет и там - считается подходящим. Значение, которое не
+    приводится к числу, отклоняет только это объявление.
+    """
+
+    def __init__(self, predicates: List[Predicate]):
+        self.predicates = tuple(predicates)
+        self.rejected: Counter = Counter()
+
+    def __bool__(self) -> bool:
+        return bool(self.predicates)
+
+    def matches(self, item: Dict) -> bool:
+        for predicate in self.predicates:
+            value = predicate.value(item)
+            if value is None:
+                continue
+            try:
+                passed = predicate.test(float(value))
+            except (TypeError, ValueError, OverflowError):
+                passed = False
+            if not passed:
+                self.rejected[predicate.name] += 1
+                return False
+        return True
+
+def parse_days(value) -> Optional[int]:
+    """Значение фильтра в днях; None для 'any' и мусора"""
+    try:
+        days = int(value)
+    except (TypeError, ValueError):
+        return None
+    return days if days > 0 else None
+
+def compile_filters(settings, now: float = None) -> FilterChain:
+    """Собирает цепочку из настроек; пороги по времени считаются один раз"""
+    now = time.time() if now is None else now
+    predicates = []
+
+    # Сначала самые дешевые и самые отсекающие проверки
+    if settings.price_min:
+        price_min = float(settings.price_min)
+        predicates.append(Predicate('price_min', ('price',), lambda price: price >= price_min))
+    if settings.price_max:
+        price_max = float(settings.price_max)
+        predicates.append(Predicate('price_max', ('price',), lambda price: price <= price_max))
+
+    # Отлежка: аккаунтом не пользовались не меньше N дней
+    activity_days = parse_days(settings.last_activity_filter)
+    if activity_days:
+        active_before = now - activity_days * DAY
+        predicates.append(Predicate(
+            'last_activity', ('account_last_activity', 'last_activity'),
+            lambda last_activity: last_activity <= active_before
+        ))
+
+    # Давность выставления: объявление опубликовано не раньше N дней назад
+    age_days = parse_days(settings.account_age_filter)
+    if age_days:
+        published_after = now - age_days * DAY
+        predicates.append(Predicate(
+            'account_age', ('published_date', 'created_time'),
+            lambda published: published >= published_after
+        ))
+
+    return FilterChain(predicates)
@@ -1,8 +1,12 @@
-import aiohttp
 import hashlib
 import hmac
+import logging
+import time
 from datetime import datetime
 from config import config
+from services.http_client import http_client
+
+logger = logging.getLogger(__name__)
 
 def generate_g2g_signature(api_key: str, secret: str, user_id: str, endpoint: str = "/offers") -> str:
     """Генерация подписи для G2G API"""
@@ -17,54 +21,109 @@ def generate_g2g_signature(api_key: str, secret: str, user_id: str, endpoint: st
     
     return signature, timestamp
 
+def _signed_headers(api_key: str, secret: str, user_id: str, endpoint: str) -> dict:
+    """Заголовки подписанного запроса к G2G API"""
+    signature, timestamp = generate_g2g_signature(api_key, secret, user_id, endpoint)
+    return {
+        "g2g-api-key": api_key,
+        "g2g-user-id": user_id,
+        "g2g-timestamp": timestamp,
+        "g2g-signature": signature
+    }
+
+def verify_g2g_webhook_signature(secret: str, user_id: str, timestamp: str, body: bytes,
+                                 signature: str, endpoint: str) -> bool:
+    """Проверка подписи вебхука G2G: HMAC-SHA256 по пути, user_id, времени и телу запроса"""
+    try:
+        sent_at = int(timestamp) / 1000
+    except (TypeError, ValueError):
+        return False
+    
+    # Старые запросы не принимаем - защита от повторной отправки перехваченного вебхука
+    if abs(time.time() - sent_at) > config.G2G_WEBHOOK_TOLERANCE:
+        return False
+    
+    canonical_string = endpoint.encode("utf8") + user_id.encode("utf8") + timestamp.encode("utf8") + body
+    expected = hmac.new(
+        key=secret.encode("utf8"),
+        msg=canonical_string,
+        digestmod=hashlib.sha256,
+    ).hexdigest()
+    
+    return hmac.compare_digest(expected, signature or "")
+
 async def test_g2g_connection(api_key: str, secret: str, user_id: str) -> bool:
     """Проверка подключения к G2G API"""
     try:
-        signature, timestamp = generate_g2g_signature(api_key, secret, user_id)
-        
-        headers = {
-            "g2g-api-key": api_key,
-            "g2g-user-id": user_id,
-            "g2g-timestamp": timestamp,
-            "g2g-signature": signature
-        }
-        
-        async with aiohttp.ClientSession() as session:
-            async with session.get(
-                f"{config.G2G_API_URL}/offers",
-                headers=headers,
-                timeout=10
-            ) as response:
-                return response.status in [200, 201]
-                
+        status, _ = await http_client.request(
+            "GET", config.G2G_API_URL, "/offers", api_key,
+            sign=lambda: _signed_headers(api_key, secret, user_id, "/offers")
+        )
+        return status in [200, 201]
+            
     except Exception as e:
-        print(f"G2G API Error: {e}")
+        logger.warning(f"⚠️ G2G connection check failed: {e!r}")
         return False
 
 async def create_g2g_offer(api_key: str, secret: str, user_id: str, offer_data: dict) -> dict:
     """Создание оффера на G2G"""
     try:
-        signature, timestamp = generate_g2g_signature(api_key, secret, user_id, "/offers")
-        
-        headers = {
-            "g2g-api-key": api_key,
-            "g2g-user-id": user_id,
-            "g2g-timestamp": timestamp,
-            "g2g-signature": signature,
-            "Content-Type": "application/json"
-        }
-        
-        async with aiohttp.ClientSession() as session:
-            async with session.post(
-                f"{config.G2G_API_URL}/offers",
-                headers=headers,
-                json=offer_data,
-                timeout=10
-            ) as response:
-                if response.status in [200, 201]:
-                    return await response.json()
-                return {}
-                
+        status, data = await http_client.request(
+            "POST", config.G2G_API_URL, "/offers", api_key,
+            headers={"Content-Type": "application/json"},
+            sign=lambda: _signed_headers(api_key, secret, user_id, "/offers"),
+            json=offer_data
+        )
+        if status in [200, 201] and data:
+            return data
+        return {}
+            
+    except Exception:
+        logger.exception("❌ G2G offer creation failed")
+        return {}
+
+async def get_g2g_orders(api_key: str, secret: str, user_id: str, status: str = "new") -> list:
+    """Заказы продавца на G2G с указанным статусом"""
+    try:
+        status_code, data = await http_client.request(
+            "GET", config.G2G_API_URL, "/orders", api_key,
+            sign=lambda: _signed_headers(api_key, secret, user_id, "/orders"),
+            params={"status": status}
+        )
+        if status_code == 200 and data:
+            return data.get('orders', [])
+        return []
+            
     except Exception as e:
-        print(f"G2G API Error: {e}")
-        return {}
\ No newline at end of file
+        logger.warning(f"⚠️ G2G orders request failed: {e!r}")
+        return []
+
+async def deliver_order(api_key: str, secret: str, user_id: str, order_id: str, account_data: dict) -> bool:
+    """Передача данных аккаунта покупателю по заказу"""
+    try:
+        endpoint = f"/orders/{order_id}/delivery"
+        status, _ = await http_client.request(
+            "POST", config.G2G_API_URL, endpoint, api_key,
+            headers={"Content-Type": "application/json"},
+            sign=lambda: _signed_headers(api_key, secret, user_id, endpoint),
+            json={"delivery_data": account_data}
+        )
+        return status in [200, 201]
+            
+    except Exception:
+        logger.exception(f"❌ G2G delivery of order {order_id} failed")
+        return False
+
+async def cancel_order(api_key: str, secret: str, user_id: str, order_id: str) -> bool:
+    """Отмена заказа на G2G"""
+    try:
+        endpoint = f"/orders/{order_id}/cancel"
+        status, _ = await http_client.request(
+            "POST", config.G2G_API_URL, endpoint, api_key,
+            sign=lambda: _signed_headers(api_key, secret, user_id, endpoint)
+        )
+        return status in [200, 201]
+            
+    except Exception:
+        logger.exception(f"❌ G2G cancellation of order {order_id} failed")
+        return False
@@ -0,0 +1,96 @@
+# services/http_client.py
+import asyncio
+import logging
+from typing import Any, Callable, Dict, Optional, Tuple
+from urllib.parse import urlparse
+
+import aiohttp
+from config import config
+from services.rate_limiter import rate_limiter, parse_retry_after
+
+logger = logging.getLogger(__name__)
+
+class HTTPClient:
+    """Общий HTTP клиент: по одной долгоживущей сессии на каждый хост"""
+
+    def __init__(self):
+        self._sessions: Dict[str, aiohttp.ClientSession] = {}
+        self._lock = asyncio.Lock()
+
+    def _create_session(self, host: str) -> aiohttp.ClientSession:
+        """Создает сессию с собственным пулом соединений для хоста"""
+        connector = aiohttp.TCPConnector(
+            limit=config.HTTP_LIMIT,
+            limit_per_host=config.HTTP_HOST_LIMITS.get(host, config.HTTP_LIMIT_PER_HOST),
+            ttl_dns_cache=config.HTTP_DNS_CACHE_TTL,
+            keepalive_timeout=config.HTTP_KEEPALIVE_TIMEOUT
+        )
+        return aiohttp.ClientSession(
+            connector=connector,
+            timeout=aiohttp.ClientTimeout(total=config.HTTP_TIMEOUT)
+        )
+
+    async def get_session(self, base_url: str) -> aiohttp.ClientSession:
+        """Возвращает сессию для хоста, создавая ее при первом обращении"""
+        host = urlparse(base_url).netloc
+        session = self._sessions.get(host)
+        if session is not None and not session.closed:
+            return session
+
+        async with self._lock:
+            session = self._sessions.get(host)
+            if session is None or session.closed:
+                session = self._create_session(host)
+                self._sessions[host] = session
+                logger.info(f"🌐 HTTP session opened for {host}")
+            return session
+
+    async def request(self, method: str, base_url: str, path: str, token: str,
+                      endpoint_class: str = "default", sign: Optional[Callable[[], Dict]] = None,
+                      **kwargs) -> Tuple[int, Any]:
+        """Запрос с учетом лимитов токена; при 429 ждет Retry-After и повторяет.
+
+        sign - функция, возвращающая заголовки подписи: вызывается перед каждой попыткой,
+        чтобы повтор после долгого Retry-After не ушел с устаревшим timestamp.
+        """
+        host = urlparse(base_url).netloc
+        session = await self.get_session(base_url)
+        headers = kwargs.pop("headers", None) or {}
+
+        for attempt in range(config.RATE_LIMIT_MAX_RETRIES + 1):
+            await rate_limiter.acquire(host, token, endpoint_class)
+
+            attempt_headers = {**headers, **sign()} if sign is not None else headers
+            async with session.request(method, f"{base_url}{path}", headers=attempt_headers, **kwargs) as response:
+                if response.status == 429 and attempt < config.RATE_LIMIT_MAX_RETRIES:
+                    delay = parse_retry_after(
+                        response.headers.get("Retry-After"),
+                        config.RATE_LIMIT_DEFAULT_RETRY_AFTER * (attempt + 1)
+                    )
+                    rate_limiter.penalize(host, token, delay)
+                    continue
+
+                if response.status in (200, 201):
+                    return response.status, await response.json(content_type=None)
+                return response.status, None
+
+    async def start(self, *base_urls: str):
+        """Заранее открывает сессии для указанных API"""
+        for base_url in base_urls:
+            await self.get_session(base_url)
+
+    async def close(self):
+        """Закрывает все сессии и соединения"""
+        async with self._lock:
+            sessions = list(self._sessions.values())
+            self._sessions.clear()
+
+        for session in sessions:
+            if not session.closed:
+                await session.close()
+
+        # Даем aiohttp время корректно закрыть SSL соединения
+        await asyncio.sleep(0.25)
+        logger.info("🌐 HTTP sessions closed")
+
+http_client = HTTPClient()
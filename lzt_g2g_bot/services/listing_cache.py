@@ -0,0 +1,125 @@
+# services/listing_cache.py
+import asyncio
+import math
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+from config import config
+from services.lzt_api import get_lzt_accounts_page
+
+def normalize_params(params: Dict) -> Dict:
+    """Расширяет ценовой диапазон до шага кэша, чтобы близкие фильтры совпадали"""
+    step = config.LISTING_CACHE_PRICE_STEP
+    normalized = dict(params)
+    if normalized.get('pmin') is not None:
+        normalized['pmin'] = math.floor(float(normalized['pmin']) / step) * step
+    if normalized.get('pmax') is not None:
+        normalized['pmax'] = math.ceil(float(normalized['pmax']) / step) * step
+    return normalized
+
+def filter_by_price(data: Dict, params: Dict) -> Dict:
+    """Оставляет объявления, попадающие в ценовой диапазон пользователя"""
+    price_min = params.get('pmin')
+    price_max = params.get('pmax')
+    if price_min is None and price_max is None:
+        return data
+
+    items = [
+        item for item in data.get('items', [])
+        if (price_min is None or item.get('price', 0) >= price_min)
+        and (price_max is None or item.get('price', 0) <= price_max)
+    ]
+    # Пагинация считается по исходной странице: после фильтра объявлений меньше perPage,
+    # но это не значит, что страница последняя
+    return {**data, 'items': items, 'upstream_count': len(data.get('items', []))}
+
+class ListingCache:
+    """Общий для всех пользователей кэш страниц LZT с объединением одинаковых запросов"""
+
+    def __init__(self, ttl: int, max_size: int):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._items: OrderedDict = OrderedDict()
+        self._inflight: Dict[Tuple, asyncio.Future] = {}
+
+    def _get_cached(self, key: Tuple, not_before: float = 0.0) -> Optional[Tuple[float, Dict]]:
+        """(время загрузки, страница) из кэша; None, если ее нет, она истекла или старше not_before"""
+        item = self._items.get(key)
+        if item is None:
+            return None
+
+        fetched_at, data = item
+        if fetched_at + self.ttl < time.monotonic():
+            del self._items[key]
+            return None
+        if fetched_at < not_before:
+            return None
+
+        self._items.move_to_end(key)
+        return item
+
+    def _store(self, key: Tuple, fetched_at: float, data: Dict):
+        self._items[key] = (fetched_at, data)
+        self._items.move_to_end(key)
+        while len(self._items) > self.max_size:
+            self._items.popitem(last=False)
+
+    async def _fetch(self, key: Tuple, category: str, params: Dict, token: str, page: int) -> Tuple[float, Dict]:
+        """Один запрос к LZT на ключ; остальные вызывающие ждут его результат"""
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            data = await get_lzt_accounts_page(category, params, token, page)
+            result = (time.monotonic(), data)
+            self._store(key, *result)
+            future.set_result(result)
+            return result
+        except BaseException as e:
+            future.set_exception(e)
+            # Исключение уже передано ожидающим - не даем asyncio ругаться на него
+            future.exception()
+            raise
+        finally:
+            self._inflight.pop(key, None)
+
+    async def get_page_at(self, category: str, params: Dict, token: str, page: int = 1,
+                          not_before: float = 0.0) -> Tuple[float, Dict]:
+        """(время загрузки по time.monotonic, страница с фильтром цены пользователя).
+
+        not_before - не отдавать страницу, загруженную раньше этого момента.
+        """
+        upstream_params = normalize_params(params)
+        key = (category, tuple(sorted(upstream_params.items())), page)
+
+        result = self._get_cached(key, not_before)
+        if result is None:
+            future = self._inflight.get(key)
+            if future is not None:
+                result = await asyncio.shield(future)
+            if result is None or result[0] < not_before:
+                result = await self._fetch(key, category, upstream_params, token, page)
+
+        fetched_at, data = result
+        return fetched_at, filter_by_price(data, params)
+
+    async def get_page(self, category: str, params: Dict, token: str, page: int = 1) -> Dict:
+        """Страница категории с фильтром цены пользователя"""
+        _, data = await self.get_page_at(category, params, token, page)
+        return data
+
+    def snapshot_pages(self):
+        """Источник страниц для одного прохода по ленте: каждая следующая страница
+        загружена не раньше первой. Иначе устаревшая страница 2 рядом со свежей
+        страницей 1 теряет объявления, сдвинутые новыми публикациями через границу."""
+        first_fetched_at = None
+
+        async def fetch_page(category: str, params: Dict, token: str, page: int = 1) -> Dict:
+            nonlocal first_fetched_at
+            fetched_at, data = await self.get_page_at(category, params, token, page, first_fetched_at or 0.0)
+            if first_fetched_at is None:
+                first_fetched_at = fetched_at
+            return data
+
+        return fetch_page
+
+listing_cache = ListingCache(config.LISTING_CACHE_TTL, config.LISTING_CACHE_SIZE)
@@ -0,0 +1,47 @@
+# services/listing_sync.py
+from typing import Dict, List, Tuple
+from services.listing_cache import listing_cache
+from services.lzt_api import get_lzt_accounts
+from database.crud import get_sync_cursor, update_sync_cursor, get_known_lzt_item_ids
+
+def listing_position(item: Dict) -> Tuple[int, int]:
+    """Позиция объявления в ленте: (дата публикации, item_id)"""
+    return int(item.get('published_date') or 0), int(item.get('item_id') or 0)
+
+class ListingSync:
+    """Инкрементальная синхронизация LZT: курсор по категории + уже выставленные item_id"""
+
+    def __init__(self, user_id: int):
+        self.user_id = user_id
+
+    async def fetch_new_accounts(self, category: str, params: Dict, lzt_token: str) -> List[Dict]:
+        """Возвращает только новые объявления категории, от старых к новым"""
+        cursor = await get_sync_cursor(self.user_id, category)
+        # Сначала самые свежие - листаем до курсора
+        params = {**params, "order_by": "pdate_to_down"}
+
+        # Страницы грузятся лениво: дойдя до курсора, следующие не запрашиваем.
+        # Сбой страницы (LZTPageError) пробрасывается - курсор тогда не сдвигается
+        new_items = {}
+        fetch_page = listing_cache.snapshot_pages()
+        async for item in get_lzt_accounts(category, params, lzt_token, fetch_page=fetch_page):
+            if listing_position(item) <= cursor:
+                # Закрепленные объявления стоят в начале ленты вне порядка дат
+                if item.get('is_sticky'):
+                    continue
+                break
+            # Закрепленное новое объявление встретится еще раз на своем месте в ленте
+            new_items[item['item_id']] = item
+        new_items = list(new_items.values())
+
+        # Отбрасываем то, что пользователь уже выставил на G2G
+        known = await get_known_lzt_item_ids(self.user_id, [item['item_id'] for item in new_items])
+        new_items = [item for item in new_items if str(item['item_id']) not in known]
+
+        new_items.sort(key=listing_position)
+        return new_items
+
+    async def commit(self, category: str, item: Dict):
+        """Сдвигает курсор: все объявления до item включительно обработаны"""
+        published_date, item_id = listing_position(item)
+        await update_sync_cursor(self.user_id, category, published_date, item_id)
@@ -1,59 +1,185 @@
-import aiohttp
+import asyncio
+import logging
+from typing import AsyncIterator, Awaitable, Callable, Dict, List
 from config import config
+from services.http_client import http_client
+from services.filters import parse_days
+
+logger = logging.getLogger(__name__)
 
 async def test_lzt_connection(token: str) -> bool:
     """Проверка подключения к LZT API"""
     try:
         headers = {"Authorization": f"Bearer {token}"}
         
-        async with aiohttp.ClientSession() as session:
-            async with session.get(
-                f"{config.LZT_API_URL}/market/me",
-                headers=headers,
-                timeout=10
-            ) as response:
-                return response.status == 200
-                
+        status, _ = await http_client.request(
+            "GET", config.LZT_API_URL, "/market/me", token,
+            headers=headers
+        )
+        return status == 200
+            
     except Exception as e:
-        print(f"LZT API Error: {e}")
+        logger.warning(f"⚠️ LZT connection check failed: {e!r}")
         return False
 
-async def get_lzt_accounts(category: str, params: dict, token: str) -> list:
-    """Получение списка аккаунтов с LZT"""
+def _query_params(params: dict) -> list:
+    """aiohttp не принимает bool и None в query - приводим к виду LZT;
+    списки и кортежи передаются повторяющимся ключом (origin[]=a&origin[]=b)"""
+    query = []
+    for key, value in params.items():
+        if value is None:
+            continue
+        for item in value if isinstance(value, (list, tuple)) else (value,):
+            query.append((key, int(item) if isinstance(item, bool) else item))
+    return query
+
+def lzt_search_params(settings, category: str) -> dict:
+    """Фильтры пользователя, которые LZT умеет применять сам, в виде query параметров"""
+    params = {
+        "pmin": settings.price_min,
+        "pmax": settings.price_max,
+        "parse_sticky_items": True
+    }
+    # Отлежка: аккаунт не заходил не меньше N дней
+    activity_days = parse_days(settings.last_activity_filter)
+    if activity_days:
+        params["daybreak"] = activity_days
+    # Значения-кортежи хешируются и могут быть частью ключа кэша листингов
+    if config.LZT_ORIGINS:
+        params["origin[]"] = tuple(config.LZT_ORIGINS)
+    for key, value in config.LZT_CATEGORY_PARAMS.get(category, {}).items():
+        params[key] = tuple(value) if isinstance(value, list) else value
+    return params
+
+def has_next_page(data: dict, page: int, items_count: int) -> bool:
+    """Есть ли у категории следующая страница; items_count - число объявлений на странице LZT
+    до локальной фильтрации"""
+    per_page = int(data.get('perPage') or 0)
+    total = data.get('totalItems')
+    if per_page and total is not None:
+        return page * per_page < int(total)
+    return per_page > 0 and items_count >= per_page
+
+class LZTPageError(Exception):
+    """Страница листинга не загрузилась - это сбой, а не конец ленты"""
+
+async def get_lzt_accounts_page(category: str, params: dict, token: str, page: int = 1) -> dict:
+    """Получение одной страницы аккаунтов с LZT вместе с данными пагинации.
+
+    При ошибке бросает LZTPageError: пустой ответ нельзя принять за последнюю страницу.
+    """
+    headers = {"Authorization": f"Bearer {token}"}
     try:
-        headers = {"Authorization": f"Bearer {token}"}
-        
-        async with aiohttp.ClientSession() as session:
-            async with session.get(
-                f"{config.LZT_API_URL}/market/{category}",
-                headers=headers,
-                params=params,
-                timeout=10
-            ) as response:
-                if response.status == 200:
-                    data = await response.json()
-                    return data.get('items', [])
-                return []
-                
+        status, data = await http_client.request(
+            "GET", config.LZT_API_URL, f"/market/{category}", token,
+            endpoint_class="search",
+            headers=headers,
+            params=_query_params({**params, "page": page})
+        )
     except Exception as e:
-        print(f"LZT API Error: {e}")
-        return []
+        logger.warning(f"⚠️ LZT listing {category} page {page} failed: {e!r}")
+        raise LZTPageError(f"{category} page {page}: {e!r}") from e
+    
+    if status != 200 or not data:
+        logger.warning(f"⚠️ LZT listing {category} page {page} failed: HTTP {status}")
+        raise LZTPageError(f"{category} page {page}: HTTP {status}")
+    return data
+
+async def get_lzt_accounts(
+    category: str,
+    params: dict,
+    token: str,
+    max_pages: int = None,
+    fetch_page: Callable[..., Awaitable[Dict]] = get_lzt_accounts_page
+) -> AsyncIterator[dict]:
+    """Аккаунты категории постранично: следующая страница запрашивается, только когда
+    потребитель дочитал предыдущую, поэтому break в async for останавливает загрузку.
+
+    fetch_page - источник страниц (например, listing_cache.get_page).
+    Сбой загрузки страницы пробрасывается как LZTPageError, а не завершает ленту.
+    """
+    max_pages = max_pages or config.LZT_SYNC_MAX_PAGES
+    for page in range(1, max_pages + 1):
+        data = await fetch_page(category, params, token, page)
+        items = data.get('items', [])
+        for item in items:
+            yield item
+
+        # Страница из кэша могла быть отфильтрована по цене - считаем по исходной
+        if not has_next_page(data, page, data.get('upstream_count', len(items))):
+            return
+
+    logger.info(f"LZT listing for {category} exceeds {max_pages} pages, older listings are skipped")
 
 async def get_lzt_account_details(item_id: str, token: str) -> dict:
-    """Получение деталей аккаунта"""
+    """Получение деталей аккаунта: поля аккаунта (item_id, price, ...) на верхнем уровне"""
     try:
         headers = {"Authorization": f"Bearer {token}"}
         
-        async with aiohttp.ClientSession() as session:
-            async with session.get(
-                f"{config.LZT_API_URL}/market/{item_id}",
-                headers=headers,
-                timeout=10
-            ) as response:
-                if response.status == 200:
-                    return await response.json()
-                return {}
-                
+        status, data = await http_client.request(
+            "GET", config.LZT_API_URL, f"/market/{item_id}", token,
+            headers=headers
+        )
+        if status == 200 and data:
+            # LZT заворачивает аккаунт в item - вызывающий код работает с плоскими полями
+            return data.get('item', data)
+        logger.warning(f"⚠️ LZT item {item_id} details failed: HTTP {status}")
+        return {}
+            
     except Exception as e:
-        print(f"LZT API Error: {e}")
-        return {}
\ No newline at end of file
+        logger.warning(f"⚠️ LZT item {item_id} details failed: {e!r}")
+        return {}
+
+async def get_lzt_accounts_details(item_ids: List[str], token: str) -> List[dict]:
+    """Параллельно получает детали аккаунтов в пределах лимита LZT"""
+    semaphore = asyncio.Semaphore(config.LZT_DETAILS_CONCURRENCY)
+    
+    async def fetch(item_id: str) -> dict:
+        # Темп запросов задает общий rate limiter токена
+        async with semaphore:
+            return await get_lzt_account_details(item_id, token)
+    
+    # Порядок результатов совпадает с порядком item_ids
+    return await asyncio.gather(*(fetch(item_id) for item_id in item_ids))
+
+async def get_purchased_account(item_id: str, token: str) -> dict:
+    """Проверяет, куплен ли уже аккаунт этим токеном (после обрыва связи во время покупки).
+
+    {'success': True, 'purchased': bool, 'account_data': {...}}; {'success': False},
+    если LZT не ответил - тогда неизвестно, прошла ли покупка.
+    """
+    item = await get_lzt_account_details(item_id, token)
+    if not item:
+        return {'success': False}
+    
+    # Данные входа LZT отдает только покупателю оплаченного аккаунта
+    login_data = item.get('loginData')
+    purchased = item.get('item_state') == 'paid' and bool(login_data)
+    return {'success': True, 'purchased': purchased, 'account_data': login_data if purchased else None}
+
+async def purchase_account(item_id: str, price: float, token: str) -> dict:
+    """Покупка аккаунта на LZT (fast-buy) с проверкой цены"""
+    try:
+        headers = {"Authorization": f"Bearer {token}"}
+        
+        # LZT откажет в покупке, если цена выросла выше переданной
+        status, data = await http_client.request(
+            "POST", config.LZT_API_URL, f"/market/{item_id}/fast-buy", token,
+            headers=headers,
+            params={"price": price}
+        )
+        if status == 200 and data:
+            item = data.get('item', {})
+            return {
+                'success': True,
+                'account_data': item.get('loginData') or {}
+            }
+        # 429 и 5xx - временные проблемы LZT, покупку можно повторить;
+        # остальные ответы - отказ (аккаунт продан, цена выросла)
+        logger.warning(f"⚠️ LZT purchase of item {item_id} failed: HTTP {status}")
+        return {'success': False, 'retryable': status == 429 or status >= 500}
+            
+    except Exception:
+        # Ответ мог потеряться после покупки - повтор сначала проверит ее (OrderProcessor)
+        logger.exception(f"❌ LZT purchase of item {item_id} failed")
+        return {'success': False, 'retryable': True}
@@ -1,49 +1,98 @@
 # services/order_checker.py
+import asyncio
 import logging
-from database.crud import get_active_users, get_user_api_keys, get_user_orders_stats
+import random
+import time
+from config import config
+from database.crud import get_active_users, get_user_api_keys, prune_webhook_events, prune_order_jobs, prune_daily_quota
 from services.encryption import encryption_service
+from services.g2g_api import get_g2g_orders
+from services.order_queue import order_queue
 
 logger = logging.getLogger(__name__)
 
 async def check_pending_orders(bot):
-    """Проверяет новые заказы каждые 5 минут"""
+    """Сверяет новые заказы G2G с очередью (страховка на случай пропущенных вебхуков)"""
     logger.info("🔍 Checking for new orders...")
+    started = time.monotonic()
     
     try:
         users = await get_active_users()
+        semaphore = asyncio.Semaphore(config.ORDER_CHECK_CONCURRENCY)
         
-        for user in users:
-            try:
-                await process_user_orders(user, bot)
-            except Exception as e:
-                logger.error(f"Error processing orders for user {user[0]}: {e}")
+        results = await asyncio.gather(
+            *(check_user_orders(user, bot, semaphore) for user in users)
+        )
+        
+        elapsed = time.monotonic() - started
+        interval = get_order_check_interval() * 60
+        failed = results.count(False)
+        
+        if elapsed > interval:
+            logger.warning(
+                f"⚠️ Order check overran: {elapsed:.1f}s for {len(users)} users "
+                f"(interval {interval}s, failed {failed})"
+            )
+        else:
+            logger.info(
+                f"✅ Order check finished: {elapsed:.1f}s for {len(users)} users "
+                f"(interval {interval}s, failed {failed})"
+            )
+        
+        await prune_webhook_events(config.G2G_WEBHOOK_EVENTS_TTL_DAYS)
+        await prune_order_jobs(config.ORDER_JOBS_TTL_DAYS)
+        await prune_daily_quota(config.QUOTA_HISTORY_DAYS)
                 
     except Exception as e:
         logger.error(f"Error in order checker: {e}")
 
+async def check_user_orders(user, bot, semaphore: asyncio.Semaphore) -> bool:
+    """Проверяет заказы одного пользователя с ограничением параллельности и таймаутом"""
+    # Размазываем запросы к G2G, чтобы не стартовать всех пользователей одновременно
+    await asyncio.sleep(random.uniform(0, config.ORDER_CHECK_JITTER))
+    
+    async with semaphore:
+        try:
+            await asyncio.wait_for(
+                process_user_orders(user, bot),
+                timeout=config.ORDER_CHECK_USER_TIMEOUT
+            )
+            return True
+        except asyncio.TimeoutError:
+            logger.error(f"Timeout processing orders for user {user.id}")
+        except Exception as e:
+            logger.error(f"Error processing orders for user {user.id}: {e}")
+        return False
+
+def get_order_check_interval() -> int:
+    """Интервал опроса G2G в минутах: с вебхуком это только сверка"""
+    if config.G2G_WEBHOOK_ENABLED:
+        return config.ORDER_RECONCILE_INTERVAL_MINUTES
+    return config.ORDER_CHECK_INTERVAL_MINUTES
+
 async def process_user_orders(user, bot):
-    """Обрабатывает заказы конкретного пользователя"""
+    """Ставит в очередь новые заказы пользователя, которых в ней еще нет"""
     # Получаем API ключи пользователя
-    api_keys = await get_user_api_keys(user[0])
-    if not api_keys or not api_keys[3]:  # g2g_api_key
+    api_keys = await get_user_api_keys(user.id)
+    if not api_keys or not api_keys.g2g_api_key:
         return
     
-    # Здесь будет реальная проверка заказов с G2G API
-    # Сейчас имитируем проверку
-    orders_stats = await get_user_orders_stats(user[0])
-    new_orders_count = orders_stats.get('new', 0)
+    credentials = encryption_service.get_credentials(user.id, api_keys)
+    orders = await get_g2g_orders(
+        credentials['g2g_api_key'],
+        credentials['g2g_secret'],
+        credentials['g2g_user_id'],
+        status="new"
+    )
     
-    if new_orders_count > 0:
-        # Отправляем уведомление пользователю
-        try:
-            await bot.send_message(
-                user[1],  # telegram_id
-                f"🔔 У вас {new_orders_count} новых заказов!\n"
-                f"Перейдите в раздел '📦 ЗАКАЗЫ G2G' для просмотра."
-            )
-            logger.info(f"Notified user {user[1]} about {new_orders_count} new orders")
-        except Exception as e:
-            logger.error(f"Failed to send notification to user {user[1]}: {e}")
+    # Уже обработанные и стоящие в очереди заказы очередь пропустит сама
+    queued = 0
+    for order in orders:
+        if await order_queue.enqueue(user.id, order):
+            queued += 1
+    
+    if queued:
+        logger.info(f"Reconciled {queued} new orders for user {user.telegram_id}")
 
 async def get_mock_orders():
     """Заглушка для теста - возвращает тестовые заказы"""
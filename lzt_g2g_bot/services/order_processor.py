@@ -1,93 +1,131 @@
 import asyncio
+import json
 from typing import Dict, Optional
-from services.lzt_api import purchase_account
+from services.lzt_api import purchase_account, get_purchased_account
 from services.g2g_api import deliver_order, cancel_order
 from services.encryption import encryption_service
-from database.crud import get_user_api_keys, get_offer_by_g2g_id, update_offer_status, create_order
+from services.pricing import offer_cost
+from database.crud import (
+    get_user_api_keys, get_offer_by_g2g_id, update_offer_status, create_order,
+    get_order_by_g2g_id, save_order_purchase, get_order_purchase_data
+)
+
+class TransientOrderError(Exception):
+    """Временная ошибка: заказ не отменяется, очередь повторит его позже"""
 
 class OrderProcessor:
-    def __init__(self, db, user_id: int):
-        self.db = db
+    def __init__(self, user_id: int):
         self.user_id = user_id
     
     async def process_new_order(self, g2g_order_data: Dict) -> Dict:
-        """Обрабатывает новый заказ с G2G"""
+        """Обрабатывает новый заказ с G2G.
+        
+        Повторный вызов для того же заказа безопасен: купленный аккаунт сохраняется
+        в user_orders, и при повторе шаг покупки пропускается.
+        """
+        order_id = g2g_order_data['order_id']
+        
+        existing_order = await get_order_by_g2g_id(order_id)
+        if existing_order and existing_order.status == 'delivered':
+            return {'success': True, 'message': 'Order already delivered', 'order_id': order_id}
+        if existing_order and existing_order.status == 'cancelled':
+            return {'error': 'Order already cancelled'}
+        
         # Получаем информацию об оффере
-        offer = await get_offer_by_g2g_id(self.db, g2g_order_data['offer_id'])
+        offer = await get_offer_by_g2g_id(self.user_id, g2g_order_data['offer_id'])
         if not offer:
             return {'error': 'Offer not found'}
         
         # Получаем API ключи
-        api_keys = await get_user_api_keys(self.db, self.user_id)
+        api_keys = await get_user_api_keys(self.user_id)
         if not api_keys:
             return {'error': 'API keys not found'}
         
         # Дешифруем ключи
-        lzt_token = encryption_service.decrypt(api_keys.lzt_token)
-        g2g_api_key = encryption_service.decrypt(api_keys.g2g_api_key)
-        g2g_secret = encryption_service.decrypt(api_keys.g2g_secret)
-        g2g_user_id = api_keys.g2g_user_id
+        credentials = encryption_service.get_credentials(self.user_id, api_keys)
+        lzt_token = credentials['lzt_token']
+        g2g_api_key = credentials['g2g_api_key']
+        g2g_secret = credentials['g2g_secret']
+        g2g_user_id = credentials['g2g_user_id']
         
-        try:
-            # Покупаем аккаунт на LZT
-            lzt_purchase = await purchase_account(
-                offer.lzt_item_id, 
-                offer.price / (1 + offer.markup_percent / 100),  # Оригинальная цена
-                lzt_token
-            )
+        # Покупаем аккаунт на LZT (один раз на заказ)
+        purchase_data = await get_order_purchase_data(order_id)
+        if purchase_data:
+            account_data = json.loads(encryption_service.decrypt(purchase_data))
+        else:
+            account_data = None
+            if existing_order and existing_order.status == 'purchasing':
+                # Прошлая попытка могла купить аккаунт, но не дождаться ответа LZT:
+                # повтор покупки получил бы "уже продан" и отменил оплаченный заказ
+                account_data = await self.find_purchased_account(offer.lzt_item_id, lzt_token)
             
-            if lzt_purchase and lzt_purchase.get('success'):
-                # Отправляем данные покупателю на G2G
-                delivery_result = await deliver_order(
-                    g2g_api_key, g2g_secret, g2g_user_id,
-                    g2g_order_data['order_id'],
-                    lzt_purchase['account_data']
+            if account_data is None:
+                # Отметка до запроса: если ответ потеряется, повтор сначала проверит покупку
+                await create_order(self.user_id, offer.id, order_id, 'purchasing')
+                lzt_purchase = await purchase_account(
+                    offer.lzt_item_id, 
+                    offer_cost(offer),  # Цена на LZT, сохраненная при выставлении
+                    lzt_token
                 )
                 
-                if delivery_result:
-                    # Обновляем статусы
-                    await update_offer_status(self.db, offer.id, 'sold')
-                    await create_order(
-                        self.db, 
-                        self.user_id,
-                        offer.id,
-                        g2g_order_data['order_id'],
-                        'delivered'
-                    )
+                if not lzt_purchase.get('success'):
+                    if lzt_purchase.get('retryable'):
+                        raise TransientOrderError('LZT purchase temporarily failed')
                     
-                    return {
-                        'success': True,
-                        'message': 'Order processed successfully',
-                        'order_id': g2g_order_data['order_id']
-                    }
-                else:
-                    # Если не удалось доставить - отменяем заказ
-                    await cancel_order(g2g_api_key, g2g_secret, g2g_user_id, g2g_order_data['order_id'])
-                    return {'error': 'Failed to deliver order'}
-            else:
-                # Если не удалось купить на LZT - отменяем заказ
-                await cancel_order(g2g_api_key, g2g_secret, g2g_user_id, g2g_order_data['order_id'])
-                await update_offer_status(self.db, offer.id, 'out_of_stock')
-                return {'error': 'Failed to purchase account on LZT'}
+                    # LZT отказал в покупке, и аккаунт не куплен нами раньше - деньги не списаны,
+                    # выполнить заказ нельзя, отменяем
+                    await cancel_order(g2g_api_key, g2g_secret, g2g_user_id, order_id)
+                    await update_offer_status(offer.id, 'out_of_stock')
+                    await create_order(self.user_id, offer.id, order_id, 'cancelled')
+                    return {'error': 'Failed to purchase account on LZT'}
                 
-        except Exception as e:
-            # В случае ошибки отменяем заказ
-            try:
-                await cancel_order(g2g_api_key, g2g_secret, g2g_user_id, g2g_order_data['order_id'])
-            except:
-                pass
-            return {'error': f'Processing error: {str(e)}'}
+                account_data = lzt_purchase['account_data']
+            
+            await save_order_purchase(
+                self.user_id, offer.id, order_id,
+                encryption_service.encrypt(json.dumps(account_data))
+            )
+        
+        # Отправляем данные покупателю на G2G; аккаунт уже куплен - только повторяем
+        delivery_result = await deliver_order(
+            g2g_api_key, g2g_secret, g2g_user_id,
+            order_id,
+            account_data
+        )
+        if not delivery_result:
+            raise TransientOrderError('G2G delivery failed')
+        
+        # Обновляем статусы
+        await update_offer_status(offer.id, 'sold')
+        await create_order(self.user_id, offer.id, order_id, 'delivered')
+        
+        return {
+            'success': True,
+            'message': 'Order processed successfully',
+            'order_id': order_id
+        }
+    
+    async def find_purchased_account(self, lzt_item_id: str, lzt_token: str) -> Optional[Dict]:
+        """Данные аккаунта, если он уже куплен по этому заказу; None - покупки не было"""
+        lookup = await get_purchased_account(lzt_item_id, lzt_token)
+        if not lookup.get('success'):
+            # Без ответа LZT нельзя ни покупать повторно, ни отменять заказ
+            raise TransientOrderError('LZT purchase state unknown')
+        if lookup['purchased']:
+            return lookup['account_data']
+        return None
     
     async def check_order_status(self, order_id: str) -> Dict:
         """Проверяет статус заказа"""
-        api_keys = await get_user_api_keys(self.db, self.user_id)
+        api_keys = await get_user_api_keys(self.user_id)
         if not api_keys:
             return {'error': 'API keys not found'}
         
-        g2g_api_key = encryption_service.decrypt(api_keys.g2g_api_key)
-        g2g_secret = encryption_service.decrypt(api_keys.g2g_secret)
-        g2g_user_id = api_keys.g2g_user_id
+        credentials = encryption_service.get_credentials(self.user_id, api_keys)
+        g2g_api_key = credentials['g2g_api_key']
+        g2g_secret = credentials['g2g_secret']
+        g2g_user_id = credentials['g2g_user_id']
         
         # Здесь будет запрос к G2G API для проверки статуса
         # Заглушка
-        return {'status': 'delivered', 'order_id': order_id}
\ No newline at end of file
+        return {'status': 'delivered', 'order_id': order_id}
@@ -0,0 +1,169 @@
+# services/order_queue.py
+import asyncio
+import json
+import logging
+import random
+import time
+from typing import Dict, List
+from config import config
+from database.crud import (
+    get_user_by_id, enqueue_order_job, claim_order_job, renew_order_job, finish_order_job,
+    retry_order_job, reset_running_order_jobs
+)
+from database.models import OrderJob
+from services.order_processor import OrderProcessor, TransientOrderError
+
+logger = logging.getLogger(__name__)
+
+def retry_delay(attempts: int) -> float:
+    """Экспоненциальная задержка перед повтором с небольшим разбросом"""
+    delay = min(config.ORDER_JOB_BACKOFF_BASE * 2 ** (attempts - 1), config.ORDER_JOB_BACKOFF_MAX)
+    return delay * random.uniform(0.8, 1.2)
+
+class OrderQueue:
+    """Очередь заказов G2G в SQLite: вебхук и сверка кладут заказы, воркеры их обрабатывают.
+
+    Задачи переживают перезапуск бота, g2g_order_id - ключ идемпотентности.
+    Временные ошибки повторяются с экспоненциальной задержкой, после
+    ORDER_JOB_MAX_ATTEMPTS попыток задача уходит в dead для ручного разбора.
+    """
+
+    def __init__(self, workers: int):
+        self.workers = workers
+        self._wakeup = asyncio.Event()
+        self._tasks: List[asyncio.Task] = []
+        self._bot = None
+
+    async def enqueue(self, user_id: int, order_data: Dict) -> bool:
+        """Ставит заказ в очередь; False, если задача по нему уже есть или заказ некорректен"""
+        if not isinstance(order_data, dict) or not order_data.get('order_id') or not order_data.get('offer_id'):
+            logger.warning(f"⚠️ Skipping malformed G2G order for user {user_id}: {order_data!r:.200}")
+            return False
+        
+        queued = await enqueue_order_job(user_id, str(order_data['order_id']), order_data)
+        if queued:
+            self.wake()
+        return queued
+
+    def wake(self):
+        """Будит воркеры: задача добавлена в order_jobs в обход enqueue (вебхук)"""
+        self._wakeup.set()
+
+    async def start(self, bot):
+        """Запускает воркеры; bot нужен для уведомлений продавцу"""
+        self._bot = bot
+        recovered = await reset_running_order_jobs()
+        if recovered:
+            logger.info(f"♻️ Requeued {recovered} order jobs interrupted by shutdown")
+
+        self._tasks = [
+            asyncio.create_task(self._worker(), name=f"order-worker-{i}")
+            for i in range(self.workers)
+        ]
+
+    async def stop(self):
+        """Останавливает воркеры; незавершенные задачи вернутся в очередь при следующем старте"""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _worker(self):
+        while True:
+            self._wakeup.clear()
+            try:
+                job = await claim_order_job(config.ORDER_JOB_LEASE_SECONDS)
+            except Exception as e:
+                logger.error(f"Failed to claim order job: {e}")
+                job = None
+
+            if job is None:
+                # Новые задачи будят воркер сразу, отложенные повторы - по таймеру
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), config.ORDER_QUEUE_POLL_INTERVAL)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            heartbeat = asyncio.create_task(self._heartbeat(job), name=f"order-job-{job.id}-heartbeat")
+            try:
+                await self._run(job)
+            except Exception as e:
+                # Задача останется running и будет выдана снова по истечении ORDER_JOB_LEASE_SECONDS
+                logger.error(f"Order job {job.id} crashed: {e}")
+            finally:
+                heartbeat.cancel()
+
+    async def _heartbeat(self, job: OrderJob):
+        """Продлевает аренду, пока воркер обрабатывает задачу: медленная покупка не отдает ее второму воркеру"""
+        while True:
+            await asyncio.sleep(config.ORDER_JOB_HEARTBEAT_SECONDS)
+            try:
+                if not await renew_order_job(job.id, job.attempts):
+                    logger.warning(f"⚠️ Lease on order job {job.id} lost, its result will be discarded")
+                    return
+            except Exception as e:
+                logger.error(f"Failed to renew lease on order job {job.id}: {e}")
+
+    async def _run(self, job: OrderJob):
+        order_data = json.loads(job.payload)
+        try:
+            result = await OrderProcessor(job.user_id).process_new_order(order_data)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            # TransientOrderError и сетевые ошибки: заказ не отменяем, повторяем позже
+            await self._retry(job, e)
+            return
+
+        if result.get('success'):
+            if not await self._finish(job, 'done'):
+                return
+            logger.info(f"✅ Order {job.g2g_order_id} delivered for user {job.user_id}")
+            await self._notify(job.user_id, f"✅ Заказ {job.g2g_order_id} оплачен и выдан покупателю")
+        else:
+            if not await self._finish(job, 'failed', result.get('error')):
+                return
+            logger.warning(f"⚠️ Order {job.g2g_order_id} for user {job.user_id} failed: {result.get('error')}")
+            await self._notify(job.user_id, f"❌ Заказ {job.g2g_order_id} не выполнен: {result.get('error')}")
+
+    async def _finish(self, job: OrderJob, status: str, error: str = None) -> bool:
+        """Записывает результат задачи; False, если ее уже забрал другой воркер"""
+        if await finish_order_job(job.id, job.attempts, status, error):
+            return True
+        logger.warning(f"⚠️ Order job {job.id} was reclaimed by another worker, {status} result discarded")
+        return False
+
+    async def _retry(self, job: OrderJob, error: Exception):
+        error_text = f"{type(error).__name__}: {error}"
+        if job.attempts >= config.ORDER_JOB_MAX_ATTEMPTS:
+            if not await self._finish(job, 'dead', error_text):
+                return
+            logger.error(f"💀 Order {job.g2g_order_id} moved to dead letter after {job.attempts} attempts: {error_text}")
+            await self._notify(
+                job.user_id,
+                f"⚠️ Заказ {job.g2g_order_id} не удалось обработать автоматически "
+                f"после {job.attempts} попыток. Проверьте его вручную на G2G."
+            )
+            return
+
+        delay = retry_delay(job.attempts)
+        if not await retry_order_job(job.id, job.attempts, error_text, time.time() + delay):
+            logger.warning(f"⚠️ Order job {job.id} was reclaimed by another worker, retry discarded")
+            return
+        level = logging.WARNING if isinstance(error, TransientOrderError) else logging.ERROR
+        logger.log(level, f"🔁 Order {job.g2g_order_id} attempt {job.attempts} failed ({error_text}), retry in {delay:.0f}s")
+
+    async def _notify(self, user_id: int, text: str):
+        if self._bot is None:
+            return
+
+        user = await get_user_by_id(user_id)
+        if not user:
+            return
+        try:
+            await self._bot.send_message(user.telegram_id, text)
+        except Exception as e:
+            logger.error(f"Failed to send notification to user {user.telegram_id}: {e}")
+
+order_queue = OrderQueue(config.ORDER_WORKERS)
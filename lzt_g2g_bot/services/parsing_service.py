@@ -1,35 +1,43 @@
 import asyncio
 from typing import List, Dict
-from services.lzt_api import get_lzt_accounts, get_lzt_account_details
+from config import config
+from services.lzt_api import LZTPageError, get_lzt_accounts, get_lzt_accounts_details, lzt_search_params
+from services.listing_cache import listing_cache
 from services.g2g_api import create_g2g_offer
 from services.encryption import encryption_service
-from database.crud import get_user_api_keys, get_user_settings
-from templates.steam import create_steam_offer
-from templates.valorant import create_valorant_offer
-# ... остальные шаблоны
+from database.crud import get_user_api_keys, get_user_settings, get_user_categories, get_category_markups
+from services.template_engine import template_engine
+from services.template_registry import template_registry
+from services.pricing import Pricer, parse_cost, from_cents
+from services.filters import compile_filters
 
 class ParsingService:
-    def __init__(self, db, user_id: int):
-        self.db = db
+    def __init__(self, user_id: int):
         self.user_id = user_id
         self.found_accounts = []
+        self.pricer = None
+        self.filters = None
     
     async def run_parsing(self) -> List[Dict]:
         """Основной метод парсинга"""
         # Получаем настройки и ключи пользователя
-        settings = await get_user_settings(self.db, self.user_id)
-        api_keys = await get_user_api_keys(self.db, self.user_id)
+        settings = await get_user_settings(self.user_id)
+        api_keys = await get_user_api_keys(self.user_id)
         
         if not settings or not api_keys:
             return []
         
         # Дешифруем токены
-        lzt_token = encryption_service.decrypt(api_keys.lzt_token)
-        g2g_api_key = encryption_service.decrypt(api_keys.g2g_api_key)
-        g2g_secret = encryption_service.decrypt(api_keys.g2g_secret)
+        credentials = encryption_service.get_credentials(self.user_id, api_keys)
+        lzt_token = credentials['lzt_token']
+        g2g_api_key = credentials['g2g_api_key']
+        g2g_secret = credentials['g2g_secret']
+        
+        self.pricer = Pricer(settings, await get_category_markups(self.user_id))
+        self.filters = compile_filters(settings)
         
         # Парсим выбранные категории
-        categories = eval(settings.parser_categories) if settings.parser_categories else []
+        categories = await get_user_categories(self.user_id)
         
         for category in categories:
             accounts = await self.parse_category(category, settings, lzt_token)
@@ -39,52 +47,55 @@ class ParsingService:
     
     async def parse_category(self, category: str, settings, lzt_token: str) -> List[Dict]:
         """Парсинг конкретной категории"""
-        params = {
-            "pmin": settings.price_min,
-            "pmax": settings.price_max,
-            "title": "",  # Можно добавить поиск по ключевым словам
-            "parse_sticky_items": True
-        }
-        
-        accounts = await get_lzt_accounts(category, params, lzt_token)
+        params = lzt_search_params(settings, category)
         processed_accounts = []
         
-        for account in accounts[:10]:  # Ограничиваем для теста
-            # Получаем детали аккаунта
-            details = await get_lzt_account_details(account['item_id'], lzt_token)
-            
-            # Применяем фильтры
-            if self.apply_filters(details, settings):
-                processed_account = await self.process_account(details, settings)
-                processed_accounts.append(processed_account)
+        # Страницы читаются, пока не наберется нужное число подходящих аккаунтов
+        batch = []
+        try:
+            async for account in get_lzt_accounts(category, params, lzt_token, fetch_page=listing_cache.get_page):
+                if self.filters.matches(account):
+                    batch.append(account)
+                    if len(batch) >= config.PARSER_PREVIEW_LIMIT:
+                        break
+        except LZTPageError:
+            # Для предпросмотра хватит уже загруженных страниц
+            pass
+        
+        # Детали загружаем параллельно, темп задает лимит LZT
+        details_list = await get_lzt_accounts_details(
+            [account['item_id'] for account in batch], lzt_token
+        )
+        
+        # Фильтры по полям, которых не было в листинге; аккаунт без цены не выставить
+        matched = []
+        for account, details in zip(batch, details_list):
+            if details and self.filters.matches(details):
+                cost = parse_cost(details.get('price') or account.get('price'))
+                if cost is not None:
+                    matched.append((details, cost))
+        
+        # Цены всей пачки считаются за один проход в целых центах
+        prices = self.pricer.price_batch((cost, category) for _, cost in matched)
+        for (details, _), price in zip(matched, prices):
+            processed_account = await self.process_account(details, from_cents(price))
+            processed_accounts.append(processed_account)
         
         return processed_accounts
     
-    def apply_filters(self, account_details: Dict, settings) -> bool:
-        """Применяет фильтры к аккаунту"""
-        # Здесь будет логика фильтрации по отлежке, давности и т.д.
-        return True  # Заглушка
-    
-    async def process_account(self, account_details: Dict, settings) -> Dict:
+    async def process_account(self, account_details: Dict, final_price: float) -> Dict:
         """Обрабатывает аккаунт и готовит для G2G"""
-        # Определяем тип аккаунта и выбираем шаблон
-        category = account_details.get('category', {}).get('name', '').lower()
-        
-        if 'steam' in category:
-            template_data = create_steam_offer(account_details, settings.markup_percent)
-        elif 'valorant' in category:
-            template_data = create_valorant_offer(account_details, settings.markup_percent)
-        # ... остальные категории
+        # Шаблон выбирается по category_id аккаунта
+        template_data = None
+        template_name = template_registry.resolve(account_details)
+        if template_name is not None:
+            template_data = template_engine.render(template_name, account_details, final_price)
         
         return {
             'lzt_data': account_details,
             'g2g_template': template_data,
-            'price': self.calculate_price(account_details.get('price', 0), settings.markup_percent)
+            'price': final_price
         }
-    
-    def calculate_price(self, original_price: float, markup_percent: int) -> float:
-        """Рассчитывает цену с наценкой"""
-        return round(original_price * (1 + markup_percent / 100), 2)
 
 async def run_parsing(user_id: int, settings, api_keys) -> List[Dict]:
     """Запуск парсинга для пользователя"""
@@ -0,0 +1,137 @@
+# services/pipeline.py
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Маркер конца потока для воркеров стадии
+_DONE = object()
+
+class Stage:
+    """Стадия конвейера: handler(item) -> результат для следующей стадии или None (элемент отброшен)"""
+
+    def __init__(self, name: str, handler: Callable[[Any], Awaitable[Any]], concurrency: int = 1,
+                 fan_out: bool = False, stoppable: bool = True):
+        self.name = name
+        self.handler = handler
+        self.concurrency = concurrency
+        # fan_out: handler возвращает список, элементы уходят дальше по одному
+        self.fan_out = fan_out
+        # stoppable=False: после stop() стадия дорабатывает уже полученные элементы
+        self.stoppable = stoppable
+        self.metrics = {
+            'processed': 0,
+            'passed': 0,
+            'dropped': 0,
+            'skipped': 0,
+            'errors': 0,
+            'busy_seconds': 0.0,
+            'max_queue': 0
+        }
+
+class Pipeline:
+    """Асинхронный конвейер с ограниченными очередями между стадиями.
+
+    Полная очередь блокирует предыдущую стадию (backpressure), у каждой стадии
+    свое число воркеров и своя статистика.
+    """
+
+    def __init__(self, stages: List[Stage], queue_size: int):
+        self.stages = stages
+        self.queue_size = queue_size
+        self._stopped = False
+
+    def stop(self):
+        """Прекращает подачу новых элементов; останавливаемые стадии пропускают остаток очереди"""
+        self._stopped = True
+
+    @property
+    def stopped(self) -> bool:
+        return self._stopped
+
+    async def run(self, source: Iterable):
+        """Прогоняет элементы source через все стадии и ждет завершения"""
+        started = time.monotonic()
+        queues = [asyncio.Queue(maxsize=self.queue_size) for _ in self.stages]
+        tasks = [asyncio.create_task(self._feed(source, queues[0], self.stages[0].concurrency))]
+
+        for index, stage in enumerate(self.stages):
+            output = queues[index + 1] if index + 1 < len(self.stages) else None
+            next_workers = self.stages[index + 1].concurrency if output is not None else 0
+            remaining = [stage.concurrency]
+            tasks.extend(
+                asyncio.create_task(self._worker(stage, queues[index], output, next_workers, remaining))
+                for _ in range(stage.concurrency)
+            )
+
+        try:
+            await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                task.cancel()
+            # Отмененные воркеры успевают доработать свои finally до выхода из run
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+        logger.info(f"Pipeline finished in {time.monotonic() - started:.1f}s: {self.format_metrics()}")
+
+    async def _feed(self, source: Iterable, queue: asyncio.Queue, workers: int):
+        for item in source:
+            if self._stopped:
+                break
+            await queue.put(item)
+        for _ in range(workers):
+            await queue.put(_DONE)
+
+    async def _worker(self, stage: Stage, queue: asyncio.Queue, output: Optional[asyncio.Queue],
+                      next_workers: int, remaining: List[int]):
+        metrics = stage.metrics
+        while True:
+            metrics['max_queue'] = max(metrics['max_queue'], queue.qsize())
+            item = await queue.get()
+            if item is _DONE:
+                break
+
+            if self._stopped and stage.stoppable:
+                metrics['skipped'] += 1
+                continue
+
+            metrics['processed'] += 1
+            handler_started = time.monotonic()
+            try:
+                result = await stage.handler(item)
+            except Exception as e:
+                metrics['errors'] += 1
+                logger.error(f"Pipeline stage {stage.name} failed: {e}")
+                continue
+            finally:
+                metrics['busy_seconds'] += time.monotonic() - handler_started
+
+            if result is None:
+                metrics['dropped'] += 1
+                continue
+
+            results = result if stage.fan_out else (result,)
+            for result_item in results:
+                metrics['passed'] += 1
+                if output is not None:
+                    await output.put(result_item)
+
+        # Последний воркер стадии закрывает поток для следующей
+        remaining[0] -= 1
+        if remaining[0] == 0 and output is not None:
+            for _ in range(next_workers):
+                await output.put(_DONE)
+
+    def metrics(self) -> Dict[str, Dict]:
+        """Статистика по стадиям"""
+        return {stage.name: dict(stage.metrics) for stage in self.stages}
+
+    def format_metrics(self) -> str:
+        return ", ".join(
+            f"{stage.name} {stage.metrics['passed']}/{stage.metrics['processed']}"
+            f" (err {stage.metrics['errors']}, skip {stage.metrics['skipped']},"
+            f" busy {stage.metrics['busy_seconds']:.1f}s, q {stage.metrics['max_queue']})"
+            for stage in self.stages
+        )
@@ -0,0 +1,194 @@
+# services/posting_scheduler.py
+import asyncio
+import logging
+import time
+from dataclasses import dataclass
+from typing import Dict, Set
+from urllib.parse import urlparse
+from config import config
+from database.crud import get_auto_posting_users, get_user_api_keys
+from services.auto_poster import AutoPoster
+from services.encryption import encryption_service
+from services.rate_limiter import rate_limiter
+
+logger = logging.getLogger(__name__)
+
+LZT_HOST = urlparse(config.LZT_API_URL).hostname
+
+def rate_limit_backoff(runs: int) -> float:
+    """Пауза после runs запусков подряд, на которых LZT отвечал 429"""
+    return min(config.AUTO_POST_BACKOFF_BASE * 2 ** (runs - 1), config.AUTO_POST_BACKOFF_MAX)
+
+@dataclass(slots=True)
+class UserState:
+    """Место пользователя в очереди автопостинга"""
+    user_id: int
+    weight: float
+    # Виртуальное время начала и окончания последнего запуска (взвешенная справедливая очередь)
+    start_tag: float = 0.0
+    finish_tag: float = 0.0
+    next_run_at: float = 0.0
+    rate_limited_runs: int = 0
+    running: bool = False
+
+class PostingScheduler:
+    """Периодический автопостинг всех пользователей с общим лимитом одновременных запусков.
+
+    Свободный слот достается готовому пользователю с наименьшим виртуальным временем
+    начала (start-time fair queuing): запуск длительностью d сдвигает его на d / вес тарифа,
+    поэтому тарифы делят время запусков в пропорции AUTO_POST_TIER_WEIGHTS, а пользователи
+    с большими каталогами не занимают все слоты. После 429 от LZT пользователь
+    откладывается с экспоненциальной паузой, не расходуя слот.
+    """
+
+    def __init__(self, concurrency: int):
+        self.concurrency = concurrency
+        self.virtual_time = 0.0
+        self._users: Dict[int, UserState] = {}
+        self._running: Set[asyncio.Task] = set()
+        self._requested: Set[int] = set()
+        self._refresh_at = 0.0
+        self._wakeup = asyncio.Event()
+        self._task = None
+
+    def request_run(self, user_id: int):
+        """Ставит пользователя в очередь вне расписания (кнопка в боте)"""
+        self._requested.add(user_id)
+        if user_id not in self._users:
+            self._refresh_at = 0.0
+        self._wakeup.set()
+
+    async def start(self):
+        self._task = asyncio.create_task(self._loop(), name="posting-scheduler")
+
+    async def stop(self):
+        """Останавливает планировщик; прерванные запуски сохраняют уже созданные офферы"""
+        tasks = [task for task in (self._task, *self._running) if task is not None]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._task = None
+
+    async def refresh(self):
+        """Синхронизирует очередь с пользователями, у которых настроен автопостинг"""
+        users = await get_auto_posting_users()
+        default_weight = config.AUTO_POST_TIER_WEIGHTS['basic']
+
+        active = set()
+        for user in users:
+            active.add(user.id)
+            weight = config.AUTO_POST_TIER_WEIGHTS.get(user.subscription_type, default_weight)
+            state = self._users.get(user.id)
+            if state is None:
+                # Новый пользователь встает в очередь с текущим виртуальным временем,
+                # а не с нуля - иначе он забрал бы все слоты, догоняя остальных
+                self._users[user.id] = UserState(user.id, weight, self.virtual_time, self.virtual_time)
+            else:
+                state.weight = weight
+
+        for user_id in list(self._users):
+            if user_id not in active and not self._users[user_id].running:
+                del self._users[user_id]
+
+        self._refresh_at = time.monotonic() + config.AUTO_POST_REFRESH_INTERVAL
+
+    async def _loop(self):
+        while True:
+            self._wakeup.clear()
+            if time.monotonic() >= self._refresh_at:
+                try:
+                    await self.refresh()
+                except Exception as e:
+                    logger.error(f"Failed to refresh auto-posting users: {e}")
+                    self._refresh_at = time.monotonic() + config.AUTO_POST_REFRESH_INTERVAL
+
+            self._dispatch()
+
+            # Спим до ближайшего запуска по расписанию; завершение запуска и
+            # запрос из бота будят цикл раньше
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self._sleep_time())
+            except asyncio.TimeoutError:
+                pass
+
+    def _dispatch(self):
+        now = time.monotonic()
+        for user_id in self._requested:
+            state = self._users.get(user_id)
+            if state is not None and not state.running:
+                state.next_run_at = min(state.next_run_at, now)
+        self._requested.clear()
+
+        while len(self._running) < self.concurrency:
+            ready = [state for state in self._users.values() if not state.running and state.next_run_at <= now]
+            if not ready:
+                return
+
+            state = min(ready, key=lambda s: (max(s.finish_tag, self.virtual_time), s.user_id))
+            state.start_tag = max(state.finish_tag, self.virtual_time)
+            self.virtual_time = state.start_tag
+            state.running = True
+
+            task = asyncio.create_task(self._run_user(state), name=f"auto-posting-{state.user_id}")
+            self._running.add(task)
+            task.add_done_callback(self._on_done)
+
+    def _on_done(self, task: asyncio.Task):
+        self._running.discard(task)
+        self._wakeup.set()
+
+    def _sleep_time(self) -> float:
+        now = time.monotonic()
+        wake_at = self._refresh_at
+        if len(self._running) < self.concurrency:
+            waiting = [state.next_run_at for state in self._users.values() if not state.running]
+            wake_at = min([wake_at, *waiting])
+        return max(0.0, wake_at - now)
+
+    async def _run_user(self, state: UserState):
+        started = time.monotonic()
+        lzt_token = None
+        try:
+            api_keys = await get_user_api_keys(state.user_id)
+            lzt_token = encryption_service.get_credentials(state.user_id, api_keys)['lzt_token']
+
+            # Токен еще на паузе после 429 - запуск просто ждал бы ее, занимая слот
+            paused = rate_limiter.paused_for(LZT_HOST, lzt_token)
+            if paused > 0:
+                self._back_off(state, paused)
+                return
+
+            stats = await asyncio.wait_for(
+                AutoPoster(state.user_id).run_auto_posting(),
+                timeout=config.AUTO_POST_RUN_TIMEOUT
+            )
+            if 'error' in stats:
+                logger.info(f"Auto-posting for user {state.user_id} skipped: {stats['error']}")
+            else:
+                logger.info(
+                    f"📤 Auto-posting for user {state.user_id}: parsed {stats['parsed']}, "
+                    f"posted {stats['posted']}, errors {stats['errors']} in {time.monotonic() - started:.1f}s"
+                )
+        except asyncio.TimeoutError:
+            logger.warning(f"⚠️ Auto-posting for user {state.user_id} timed out after {config.AUTO_POST_RUN_TIMEOUT}s")
+        except Exception as e:
+            logger.error(f"Auto-posting for user {state.user_id} failed: {e}")
+        finally:
+            state.running = False
+
+        # Запуск оплачивается в виртуальном времени пропорционально длительности и обратно весу
+        state.finish_tag = state.start_tag + (time.monotonic() - started) / state.weight
+
+        if lzt_token and rate_limiter.last_penalized(LZT_HOST, lzt_token) >= started:
+            self._back_off(state, rate_limiter.paused_for(LZT_HOST, lzt_token))
+        else:
+            state.rate_limited_runs = 0
+            state.next_run_at = time.monotonic() + config.AUTO_POST_USER_INTERVAL_MINUTES * 60
+
+    def _back_off(self, state: UserState, paused: float):
+        state.rate_limited_runs += 1
+        delay = max(paused, rate_limit_backoff(state.rate_limited_runs))
+        state.next_run_at = time.monotonic() + delay
+        logger.warning(f"⏳ Auto-posting for user {state.user_id} rate limited by LZT, next run in {delay:.0f}s")
+
+posting_scheduler = PostingScheduler(config.AUTO_POST_CONCURRENCY)
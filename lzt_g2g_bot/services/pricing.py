@@ -0,0 +1,90 @@
+# services/pricing.py
+from dataclasses import dataclass
+from decimal import Decimal, ROUND_HALF_UP
+from typing import Dict, Iterable, List, Optional, Tuple
+from config import config
+
+CENT = Decimal('0.01')
+BASIS_POINTS = 10000
+
+def to_cents(amount) -> int:
+    """Сумма в долларах (float/str/Decimal) -> целые центы без ошибок двоичного float"""
+    return int((Decimal(str(amount)) / CENT).quantize(Decimal(1), rounding=ROUND_HALF_UP))
+
+def parse_cost(amount) -> Optional[int]:
+    """Цена LZT -> центы; None, если цены нет, она не число или не положительная"""
+    try:
+        cost = to_cents(amount)
+    except (ArithmeticError, ValueError):
+        return None
+    return cost if cost > 0 else None
+
+def percent_to_bp(percent) -> int:
+    """Проценты (float/str/Decimal) -> целые базисные пункты: 2.5 -> 250"""
+    return int((Decimal(str(percent)) * BASIS_POINTS / 100).quantize(Decimal(1), rounding=ROUND_HALF_UP))
+
+def from_cents(cents: int) -> float:
+    """Центы -> доллары для API и колонок REAL"""
+    return float(Decimal(cents) * CENT)
+
+def _div_round(numerator: int, denominator: int) -> int:
+    """Целочисленное деление с округлением половины вверх"""
+    return (2 * numerator + denominator) // (2 * denominator)
+
+def _div_ceil(numerator: int, denominator: int) -> int:
+    return -(-numerator // denominator)
+
+@dataclass(frozen=True, slots=True)
+class PricingRule:
+    """Наценка одной категории; все суммы в центах, комиссия G2G в базисных пунктах"""
+    markup_percent: int
+    markup_fixed: int = 0
+    min_profit: int = 0
+    fee_bp: int = 0
+
+    def __post_init__(self):
+        if not 0 <= self.fee_bp < BASIS_POINTS:
+            raise ValueError(f"fee_bp must be in [0, {BASIS_POINTS}), got {self.fee_bp}")
+
+    def price(self, cost: int) -> int:
+        """Цена на G2G, после комиссии которой остается себестоимость + прибыль"""
+        profit = max(_div_round(cost * self.markup_percent, 100) + self.markup_fixed, self.min_profit)
+        # Комиссию G2G платит продавец с цены продажи: price * (1 - fee) >= cost + profit
+        return _div_ceil((cost + profit) * BASIS_POINTS, BASIS_POINTS - self.fee_bp)
+
+class Pricer:
+    """Цены объявлений пользователя: наценка из настроек, переопределения по категориям,
+    фиксированная наценка, минимальная прибыль и комиссия G2G. Считает в целых центах."""
+
+    def __init__(self, settings, category_markups: Optional[Dict[str, int]] = None):
+        base = dict(
+            markup_fixed=to_cents(settings.markup_fixed or 0),
+            min_profit=to_cents(config.PRICING_MIN_PROFIT),
+            fee_bp=percent_to_bp(config.G2G_FEE_PERCENT)
+        )
+        self.default_rule = PricingRule(settings.markup_percent, **base)
+        self.rules = {
+            category: PricingRule(markup_percent, **base)
+            for category, markup_percent in (category_markups or {}).items()
+        }
+
+    def rule(self, category: Optional[str]) -> PricingRule:
+        return self.rules.get(category, self.default_rule)
+
+    def price(self, cost: int, category: Optional[str] = None) -> int:
+        """Цена продажи в центах для себестоимости cost в центах"""
+        return self.rule(category).price(cost)
+
+    def price_batch(self, items: Iterable[Tuple[int, Optional[str]]]) -> List[int]:
+        """Цены для пар (себестоимость в центах, категория) за один проход"""
+        rules = self.rules
+        default_rule = self.default_rule
+        return [rules.get(category, default_rule).price(cost) for cost, category in items]
+
+def offer_cost(offer) -> float:
+    """Себестоимость оффера на LZT; для старых записей без lzt_price - оценка по цене и наценке"""
+    if offer.lzt_price is not None:
+        return offer.lzt_price
+    # До появления lzt_price сохранялась только цена продажи с процентной наценкой
+    price = Decimal(str(offer.price or 0))
+    return float((price * 100 / (100 + offer.markup_percent)).quantize(CENT, rounding=ROUND_HALF_UP))
@@ -0,0 +1,123 @@
+# services/rate_limiter.py
+import asyncio
+import hashlib
+import logging
+import time
+from email.utils import parsedate_to_datetime
+from typing import Dict, Optional, Tuple
+
+from config import config
+
+logger = logging.getLogger(__name__)
+
+class TokenBucket:
+    """Token bucket: не больше rate запросов в секунду, всплески до capacity"""
+
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def pause(self, seconds: float):
+        """Останавливает выдачу токенов (например, после ответа 429)"""
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+        self._tokens = 0.0
+
+    def paused_for(self) -> float:
+        """Сколько секунд осталось до конца паузы"""
+        return max(0.0, self._paused_until - time.monotonic())
+
+    async def acquire(self, tokens: int = 1):
+        """Ждет, пока в корзине не появится нужное число токенов"""
+        # Ожидающие обслуживаются по очереди через lock - запросы идут в порядке FIFO
+        async with self._lock:
+            while True:
+                paused = self._paused_until - time.monotonic()
+                if paused > 0:
+                    await asyncio.sleep(paused)
+                    self._updated = time.monotonic()
+                    continue
+
+                self._refill()
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+                await asyncio.sleep((tokens - self._tokens) / self.rate)
+
+class RateLimiter:
+    """Лимиты запросов по (хост, API токен, класс эндпоинта)"""
+
+    def __init__(self, limits: Dict[str, Dict[str, Tuple[int, int]]]):
+        # limits: host -> {класс эндпоинта: (запросов в минуту, всплеск)}
+        self.limits = limits
+        self._buckets: Dict[Tuple[str, str, str], TokenBucket] = {}
+        # Время последнего 429 по (хост, токен) - для отсрочки запусков планировщиком
+        self._penalized_at: Dict[Tuple[str, str], float] = {}
+
+    @staticmethod
+    def _token_key(token: str) -> str:
+        """Токен не хранится в памяти в открытом виде"""
+        return hashlib.sha256(token.encode()).hexdigest()[:16]
+
+    def get_bucket(self, host: str, token: str, endpoint_class: str = "default") -> Optional[TokenBucket]:
+        """Возвращает корзину для токена; None, если для хоста нет лимитов"""
+        host_limits = self.limits.get(host)
+        if not host_limits:
+            return None
+
+        endpoint_class = endpoint_class if endpoint_class in host_limits else "default"
+        key = (host, self._token_key(token), endpoint_class)
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            per_minute, burst = host_limits[endpoint_class]
+            bucket = TokenBucket(per_minute / 60, burst)
+            self._buckets[key] = bucket
+        return bucket
+
+    async def acquire(self, host: str, token: str, endpoint_class: str = "default"):
+        """Ждет разрешения на запрос"""
+        bucket = self.get_bucket(host, token, endpoint_class)
+        if bucket is not None:
+            await bucket.acquire()
+
+    def penalize(self, host: str, token: str, seconds: float):
+        """Приостанавливает все классы запросов токена на хосте (ответ 429)"""
+        token_key = self._token_key(token)
+        for endpoint_class in self.limits.get(host, {}):
+            bucket = self.get_bucket(host, token, endpoint_class)
+            bucket.pause(seconds)
+        self._penalized_at[(host, token_key)] = time.monotonic()
+        logger.warning(f"⏳ Rate limited by {host} (token {token_key[:6]}…), pausing {seconds:.1f}s")
+
+    def last_penalized(self, host: str, token: str) -> float:
+        """Момент (time.monotonic) последнего 429 для токена; 0, если их не было"""
+        return self._penalized_at.get((host, self._token_key(token)), 0.0)
+
+    def paused_for(self, host: str, token: str) -> float:
+        """Сколько секунд еще действует пауза токена на хосте после 429"""
+        token_key = self._token_key(token)
+        buckets = (self._buckets.get((host, token_key, endpoint_class)) for endpoint_class in self.limits.get(host, {}))
+        return max((bucket.paused_for() for bucket in buckets if bucket is not None), default=0.0)
+
+def parse_retry_after(value: Optional[str], default: float) -> float:
+    """Разбирает заголовок Retry-After (секунды или HTTP-дата)"""
+    if not value:
+        return default
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return default
+
+rate_limiter = RateLimiter(config.RATE_LIMITS)
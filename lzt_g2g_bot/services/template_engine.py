@@ -0,0 +1,181 @@
+# services/template_engine.py
+import logging
+import os
+from datetime import datetime
+from string import Formatter
+from typing import Any, Callable, Dict, List, Optional
+from config import config
+
+logger = logging.getLogger(__name__)
+
+MISSING_VALUE = "Unknown"
+SECTION_SEPARATOR = "---"
+
+def _steam_games(games) -> List[str]:
+    """steam_full_games.list -> ["Title - 4.17h", ...] по убыванию наигранных часов"""
+    items = games.values() if isinstance(games, dict) else games
+    items = sorted(items, key=lambda game: float(game.get('playtime_forever') or 0), reverse=True)
+    return [f"{game.get('title', '?')} - {float(game.get('playtime_forever') or 0):.2f}h" for game in items]
+
+def _date(value) -> str:
+    return datetime.fromtimestamp(int(value)).strftime("%d/%m/%Y")
+
+# Фильтры после | в подстановке: {steam_full_games.list|games|top3|lines}
+FILTERS: Dict[str, Callable[[Any], Any]] = {
+    'count': len,
+    'join': lambda value: ", ".join(map(str, value)),
+    'lines': lambda value: "\n".join(map(str, value)),
+    'top3': lambda value: list(value)[:3],
+    'upper': lambda value: str(value).upper(),
+    'date': _date,
+    'games': _steam_games,
+}
+
+def _compile_field(field: str, spec: str) -> Callable[[Dict], str]:
+    """Подстановка "a.b|filter:spec" -> функция account -> строка"""
+    path, *filter_names = field.split('|')
+    keys = tuple(path.split('.'))
+    filters = tuple(FILTERS[name] for name in filter_names)
+
+    def render(account: Dict) -> str:
+        value = account
+        for key in keys:
+            if not isinstance(value, dict):
+                return MISSING_VALUE
+            value = value.get(key)
+            if value is None or value == "":
+                return MISSING_VALUE
+        try:
+            for apply in filters:
+                value = apply(value)
+            if isinstance(value, (list, tuple)):
+                value = ", ".join(map(str, value))
+            return format(value, spec) if spec else str(value)
+        except (TypeError, ValueError, AttributeError):
+            return MISSING_VALUE
+
+    return render
+
+def compile_text(text: str) -> Callable[[Dict], str]:
+    """Разбирает текст шаблона один раз: литералы уходят в строку формата, поля - в функции"""
+    literal_parts = []
+    fields = []
+    for literal, field, spec, _ in Formatter().parse(text):
+        literal_parts.append(literal.replace('{', '{{').replace('}', '}}'))
+        if field is not None:
+            literal_parts.append(f"{{{len(fields)}}}")
+            fields.append(_compile_field(field, spec or ''))
+
+    fmt = ''.join(literal_parts)
+    fields = tuple(fields)
+    if not fields:
+        return lambda account: fmt.format()
+
+    def render(account: Dict) -> str:
+        return fmt.format(*[field(account) for field in fields])
+
+    return render
+
+def truncate_title(title: str, limit: int) -> str:
+    """Обрезает название до лимита G2G по границе слова"""
+    if len(title) <= limit:
+        return title
+
+    cut = title[:limit - 1]
+    space = cut.rfind(' ')
+    if space > limit // 2:
+        cut = cut[:space]
+    return cut.rstrip(' /,-|') + '…'
+
+class OfferTemplate:
+    """Скомпилированный шаблон объявления одной игры"""
+    __slots__ = ('name', 'meta', 'title', 'description')
+
+    def __init__(self, name: str, meta: Dict[str, str], title: Callable, description: Callable):
+        self.name = name
+        self.meta = meta
+        self.title = title
+        self.description = description
+
+    def render(self, account: Dict, final_price: float) -> Dict:
+        """Объявление G2G из JSON аккаунта LZT; цену считает services.pricing"""
+        title = truncate_title(' '.join(self.title(account).split()), config.G2G_TITLE_MAX_LENGTH)
+        description = self.description(account)
+
+        offer_data = {
+            'title': title,
+            'description': description,
+            'price': final_price,
+            'stock': 1,
+            'auto_accept': True,
+            'instant_delivery': True
+        }
+        # ID категории и игры на G2G задаются в заголовке шаблона
+        for key in ('category_id', 'game_id'):
+            if key in self.meta:
+                offer_data[key] = self.meta[key]
+
+        return {
+            'title': title,
+            'description': description,
+            'price': final_price,
+            'category': self.meta.get('category', self.name),
+            'game': self.meta.get('game', self.meta.get('category', self.name)),
+            'offer_data': offer_data
+        }
+
+def parse_template(name: str, text: str) -> OfferTemplate:
+    """Файл шаблона: "ключ: значение" строки, ---, название, ---, описание"""
+    sections = text.replace('\r\n', '\n').split(f"\n{SECTION_SEPARATOR}\n", 2)
+    if len(sections) != 3:
+        raise ValueError(f"template {name}: expected header, title and description separated by {SECTION_SEPARATOR}")
+
+    header, title, description = sections
+    meta = {}
+    for line in header.splitlines():
+        if line.strip() and not line.lstrip().startswith('#'):
+            key, _, value = line.partition(':')
+            meta[key.strip()] = value.strip()
+
+    return OfferTemplate(name, meta, compile_text(title.strip()), compile_text(description.strip('\n')))
+
+class TemplateEngine:
+    """Шаблоны templates/*.txt, загруженные и скомпилированные один раз при старте"""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.templates: Dict[str, OfferTemplate] = {}
+        self.load()
+
+    def load(self):
+        """(Пере)загружает все шаблоны каталога; пустые и битые файлы пропускаются"""
+        templates = {}
+        for filename in sorted(os.listdir(self.directory)):
+            name, ext = os.path.splitext(filename)
+            if ext != '.txt':
+                continue
+
+            with open(os.path.join(self.directory, filename), encoding='utf-8') as f:
+                text = f.read()
+            if not text.strip():
+                continue
+
+            try:
+                templates[name] = parse_template(name, text)
+            except (ValueError, KeyError) as e:
+                logger.error(f"❌ Template {filename} skipped: {e}")
+
+        self.templates = templates
+        logger.info(f"✅ Loaded {len(templates)} offer templates")
+
+    def get(self, name: str) -> Optional[OfferTemplate]:
+        return self.templates.get(name)
+
+    def render(self, name: str, account: Dict, final_price: float) -> Optional[Dict]:
+        """Объявление по шаблону name; None, если шаблона нет"""
+        template = self.templates.get(name)
+        if template is None:
+            return None
+        return template.render(account, final_price)
+
+template_engine = TemplateEngine(config.TEMPLATES_DIR)
@@ -0,0 +1,71 @@
+# services/template_registry.py
+from typing import Callable, Dict, Optional, Tuple, Union
+
+TemplateSelector = Callable[[Dict], Optional[str]]
+
+# ID категорий LZT Market. Riot, miHoYo и Supercell объединяют несколько игр
+LZT_STEAM = 1
+LZT_RIOT = 13
+LZT_SUPERCELL = 15
+LZT_MIHOYO = 17
+LZT_MINECRAFT = 28
+
+def first_present(*rules: Tuple[str, str]) -> TemplateSelector:
+    """Шаблон первой игры, поле которой заполнено в аккаунте: (поле LZT, шаблон), ..."""
+    def select(account: Dict) -> Optional[str]:
+        for field, template_name in rules:
+            if account.get(field):
+                return template_name
+        return None
+    return select
+
+def account_category_id(account: Dict) -> Optional[int]:
+    """category_id объявления LZT (в деталях бывает и внутри category)"""
+    category_id = account.get('category_id')
+    if category_id is None:
+        category_id = (account.get('category') or {}).get('category_id')
+    try:
+        return int(category_id)
+    except (TypeError, ValueError):
+        return None
+
+class TemplateRegistry:
+    """Выбор шаблона объявления по category_id LZT одним поиском в словаре.
+
+    Плагины добавляют игры через register() - без правок цикла автопостинга.
+    """
+
+    def __init__(self):
+        self._selectors: Dict[int, TemplateSelector] = {}
+
+    def register(self, category_id: int, template: Union[str, TemplateSelector]):
+        """Шаблон категории: имя файла из templates/ или функция выбора по аккаунту"""
+        if callable(template):
+            self._selectors[int(category_id)] = template
+        else:
+            self._selectors[int(category_id)] = lambda account: template
+
+    def resolve(self, account: Dict) -> Optional[str]:
+        """Имя шаблона для аккаунта; None, если категория не поддерживается"""
+        selector = self._selectors.get(account_category_id(account))
+        if selector is None:
+            return None
+        return selector(account)
+
+template_registry = TemplateRegistry()
+template_registry.register(LZT_STEAM, 'steam')
+template_registry.register(LZT_RIOT, first_present(
+    ('riot_valorant_level', 'valorant'),
+    ('riot_valorant_region', 'valorant'),
+    ('riot_lol_level', 'lol'),
+))
+template_registry.register(LZT_MIHOYO, first_present(
+    ('genshin_level', 'genshin'),
+    ('honkai_level', 'honkai'),
+    ('zenless_level', 'zzz'),
+))
+template_registry.register(LZT_SUPERCELL, first_present(
+    ('supercell_brawler_count', 'brawl_stars'),
+    ('supercell_town_hall_level', 'clash_of_clans'),
+))
+template_registry.register(LZT_MINECRAFT, 'minecraft')
@@ -0,0 +1,123 @@
+# services/webhook_server.py
+import asyncio
+import contextlib
+import json
+import logging
+from typing import Optional
+import uvicorn
+from cryptography.fernet import InvalidToken
+from fastapi import FastAPI, HTTPException, Request
+from config import config
+from database.crud import get_api_keys_by_g2g_user_id, register_webhook_event
+from services.encryption import encryption_service
+from services.g2g_api import verify_g2g_webhook_signature
+from services.order_queue import order_queue
+
+logger = logging.getLogger(__name__)
+
+# События G2G, после которых заказ нужно выполнить
+ORDER_EVENTS = {"order.created", "order.paid"}
+
+app = FastAPI(docs_url=None, redoc_url=None, openapi_url=None)
+
+@app.post(config.G2G_WEBHOOK_PATH)
+async def g2g_webhook(request: Request):
+    """Прием событий G2G: проверка подписи, дедупликация и постановка заказа в очередь"""
+    body = await request.body()
+    # Один ответ на любой отказ: по нему нельзя узнать, какие ID продавцов зарегистрированы
+    unauthorized = HTTPException(status_code=401, detail="Unauthorized")
+    g2g_user_id = request.headers.get("g2g-user-id")
+    if not g2g_user_id:
+        raise unauthorized
+
+    api_keys = await get_api_keys_by_g2g_user_id(g2g_user_id)
+    if not api_keys or not api_keys.g2g_secret:
+        raise unauthorized
+
+    try:
+        credentials = encryption_service.get_credentials(api_keys.user_id, api_keys)
+    except InvalidToken:
+        # Ключи зашифрованы неизвестным ключом - 503, чтобы G2G повторил доставку после исправления
+        logger.error(f"Failed to decrypt G2G keys of user {api_keys.user_id} for webhook")
+        raise HTTPException(status_code=503, detail="Service unavailable")
+    if not verify_g2g_webhook_signature(
+        credentials['g2g_secret'],
+        g2g_user_id,
+        request.headers.get("g2g-timestamp"),
+        body,
+        request.headers.get("g2g-signature"),
+        request.url.path
+    ):
+        raise unauthorized
+
+    try:
+        event = json.loads(body)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid JSON")
+    if not isinstance(event, dict):
+        raise HTTPException(status_code=400, detail="Event must be a JSON object")
+
+    event_id = str(event.get('event_id') or request.headers.get("g2g-event-id") or "")
+    event_type = event.get('event_type')
+    if not event_id:
+        raise HTTPException(status_code=400, detail="Missing event id")
+
+    order_data = None
+    if event_type in ORDER_EVENTS:
+        data = event.get('data')
+        if isinstance(data, dict) and data.get('order_id') and data.get('offer_id'):
+            order_data = data
+
+    # Событие и задача заказа пишутся одной транзакцией: если запись упала, G2G получит 5xx
+    # и повторит доставку, а не увидит дубликат. Повтор уже принятого события просто подтверждаем
+    registered, queued = await register_webhook_event(event_id, api_keys.user_id, event_type, order_data)
+    if not registered:
+        return {"status": "duplicate"}
+
+    if order_data is not None:
+        if queued:
+            order_queue.wake()
+        logger.info(f"📥 Webhook {event_type} for order {order_data['order_id']} (queued: {queued})")
+
+    return {"status": "ok"}
+
+class EmbeddedServer(uvicorn.Server):
+    """uvicorn внутри цикла событий бота: сигналы остановки обрабатывает aiogram"""
+
+    def install_signal_handlers(self):
+        # uvicorn < 0.29
+        pass
+
+    @contextlib.contextmanager
+    def capture_signals(self):
+        # uvicorn >= 0.29
+        yield
+
+class WebhookServer:
+    """Запуск и остановка HTTP сервера вебхуков"""
+
+    def __init__(self, host: str, port: int):
+        self.host = host
+        self.port = port
+        self._server: Optional[EmbeddedServer] = None
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        self._server = EmbeddedServer(uvicorn.Config(
+            app,
+            host=self.host,
+            port=self.port,
+            log_level="warning",
+            access_log=False
+        ))
+        self._task = asyncio.create_task(self._server.serve(), name="g2g-webhook-server")
+
+    async def close(self):
+        if self._server is None:
+            return
+        self._server.should_exit = True
+        await self._task
+        self._server = None
+        self._task = None
+
+webhook_server = WebhookServer(config.G2G_WEBHOOK_HOST, config.G2G_WEBHOOK_PORT)
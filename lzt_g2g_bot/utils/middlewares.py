@@ -0,0 +1,23 @@
+from typing import Any, Awaitable, Callable, Dict
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject
+from database.crud import get_or_create_user
+
+class UserMiddleware(BaseMiddleware):
+    """Передает в хендлеры пользователя бота (аргумент user), из кэша или БД"""
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        from_user = data.get("event_from_user")
+        if from_user is not None:
+            data["user"] = await get_or_create_user(
+                telegram_id=from_user.id,
+                username=from_user.username,
+                first_name=from_user.first_name,
+                last_name=from_user.last_name
+            )
+        return await handler(event, data)